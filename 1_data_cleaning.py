@@ -1,8 +1,11 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime
-import re
 import os
+from contextlib import nullcontext
+from storage import write_table, TableAppender
+from team_registry import canonical_name
+from instrumentation import timed, report, profiling
 
 # Créer des répertoires s'ils n'existent pas
 os.makedirs('processed_data', exist_ok=True)
@@ -12,11 +15,33 @@ RAW_PATH = 'raw_data'
 PROCESSED_PATH = 'processed_data'
 
 def normalize_team_name(name):
-    """Normalise les noms d'équipes: strip, title case"""
-    if pd.isna(name):
-        return name
-    return name.strip().title()
+    """Normalise les noms d'équipes: nom canonique du registre (alias français, variantes
+    et noms historiques), sinon strip + title case"""
+    return canonical_name(name)
 
+# Table mémoïsée nom brut -> nom normalisé (chaque nom distinct n'est traité qu'une fois)
+_TEAM_NAME_TABLE = {}
+
+def normalize_team_names(names):
+    """Version vectorisée de normalize_team_name pour une Series"""
+    new_names = pd.Series(names.dropna().unique()).astype(str)
+    new_names = new_names[~new_names.isin(_TEAM_NAME_TABLE.keys())]
+    _TEAM_NAME_TABLE.update(zip(new_names, new_names.map(canonical_name)))
+    return names.map(_TEAM_NAME_TABLE)
+
+def match_result(home_score, away_score):
+    """Résultat W/D/L du point de vue de l'équipe à domicile"""
+    return np.select([home_score > away_score, home_score < away_score], ['W', 'L'], default='D')
+
+def convert_goal_difference(gd):
+    """'+78', '−14', '0' -> entiers (0 si vide ou invalide); chaque valeur distincte n'est convertie qu'une fois"""
+    uniques = pd.Series(gd.dropna().unique())
+    text = uniques.astype(str).str.replace('+', '', regex=False).str.replace(r'[−–]', '-', regex=True)
+    valid = text.str.fullmatch(r'\s*-?\d+\s*').fillna(False).astype(bool)
+    table = pd.Series(pd.to_numeric(text.where(valid), errors='coerce').to_numpy(), index=uniques.to_numpy())
+    return gd.map(table).fillna(0).astype(int)
+
+@timed('cleaning.african_football')
 def clean_african_football():
     print("Cleaning: African National Football...")
     df = pd.read_csv(f'{RAW_PATH}/African national football from 2010-2024.csv')
@@ -27,38 +52,29 @@ def clean_african_football():
     df['month'] = df['date'].dt.month
     
     # Normalisation des noms
-    df['home_team'] = df['home_team'].apply(normalize_team_name)
-    df['away_team'] = df['away_team'].apply(normalize_team_name)
+    df['home_team'] = normalize_team_names(df['home_team'])
+    df['away_team'] = normalize_team_names(df['away_team'])
     
     # Suppression des matchs sans score
     df = df.dropna(subset=['home_score', 'away_score'])
     
     # Création de la colonne résultat
-    def get_result(row):
-        if row['home_score'] > row['away_score']: return 'W'
-        elif row['home_score'] < row['away_score']: return 'L'
-        else: return 'D'
-    
-    df['result'] = df.apply(get_result, axis=1)
-    df.to_csv(f'{PROCESSED_PATH}/cleaned_african_football.csv', index=False)
+    df['result'] = match_result(df['home_score'], df['away_score'])
+    write_table(df, 'cleaned_african_football')
 
+@timed('cleaning.can_matches')
 def clean_can_matches():
     print("Cleaning: CAN Matches...")
     df = pd.read_csv(f'{RAW_PATH}/Africa Cup of Nations Matches.csv')
     df.columns = df.columns.str.strip()
     
-    # Analyse de la date
-    def parse_can_date(date_str):
-        if pd.isna(date_str): return None
-        try: return pd.to_datetime(date_str, format='%d-%b-%y')
-        except: return None
-        
-    df['Date'] = df['Date'].apply(parse_can_date)
+    # Analyse de la date (dates invalides -> NaT)
+    df['Date'] = pd.to_datetime(df['Date'], format='%d-%b-%y', errors='coerce')
     df['year'] = df['Year']
     
     # Normalisation des noms
-    df['HomeTeam'] = df['HomeTeam'].apply(normalize_team_name)
-    df['AwayTeam'] = df['AwayTeam'].apply(normalize_team_name)
+    df['HomeTeam'] = normalize_team_names(df['HomeTeam'])
+    df['AwayTeam'] = normalize_team_names(df['AwayTeam'])
     
     # Suppression des victoires aux tirs au but de la logique de résultat (optionnel selon le notebook)
     df['is_penalty_shootout'] = df['SpecialWinConditions'].fillna('').str.contains('win on penalties|win after penalties', case=False, na=False)
@@ -67,12 +83,7 @@ def clean_can_matches():
     # Dropna et création du résultat
     df = df.dropna(subset=['HomeTeamGoals', 'AwayTeamGoals'])
     
-    def get_can_result(row):
-        if row['HomeTeamGoals'] > row['AwayTeamGoals']: return 'W'
-        elif row['HomeTeamGoals'] < row['AwayTeamGoals']: return 'L'
-        else: return 'D'
-        
-    df['result'] = df.apply(get_can_result, axis=1)
+    df['result'] = match_result(df['HomeTeamGoals'], df['AwayTeamGoals'])
     
     # Renommage des colonnes
     df = df.rename(columns={
@@ -80,63 +91,85 @@ def clean_can_matches():
         'HomeTeamGoals': 'home_score', 'AwayTeamGoals': 'away_score',
         'Stage': 'stage'
     })
-    df.to_csv(f'{PROCESSED_PATH}/cleaned_can_matches.csv', index=False)
+    write_table(df, 'cleaned_can_matches')
+
+# Lecture par morceaux du classement FIFA: seules les colonnes utiles, types explicites
+FIFA_CHUNK_SIZE = 100_000
+FIFA_DTYPES = {
+    'rank': 'Int64', 'country_full': 'str', 'country_abrv': 'str', 'total_points': 'float64',
+    'previous_points': 'float64', 'rank_change': 'Int64', 'confederation': 'str', 'rank_date': 'str'
+}
+
+def iter_fifa_caf_chunks(path, chunksize=FIFA_CHUNK_SIZE):
+    """Itère sur le fichier FIFA par morceaux en ne gardant que les lignes CAF"""
+    reader = pd.read_csv(path, usecols=list(FIFA_DTYPES), dtype=FIFA_DTYPES, chunksize=chunksize)
+    for chunk in reader:
+        chunk = chunk[chunk['confederation'] == 'CAF'].copy()
+        if chunk.empty: continue
+        chunk['rank_date'] = pd.to_datetime(chunk['rank_date'], format='%Y-%m-%d')
+        chunk['country_full'] = normalize_team_names(chunk['country_full'])
+        yield chunk
 
-def clean_fifa_ranking():
+def latest_per_country(df):
+    """Dernier classement connu de chaque pays"""
+    df = df.sort_values('rank_date', ascending=False, kind='stable')
+    return df.groupby('country_full').first().reset_index()
+
+@timed('cleaning.fifa_ranking')
+def clean_fifa_ranking(keep_history=True, chunksize=FIFA_CHUNK_SIZE):
     print("Cleaning: FIFA Ranking...")
-    df = pd.read_csv(f'{RAW_PATH}/fifa_ranking-2024-06-20.csv')
-    df['rank_date'] = pd.to_datetime(df['rank_date'])
-    
-    # Filtrer l'Afrique
-    df_africa = df[df['confederation'] == 'CAF'].copy()
-    df_africa['country_full'] = df_africa['country_full'].apply(normalize_team_name)
-    
-    # Garder le dernier
-    df_africa = df_africa.sort_values('rank_date', ascending=False)
-    df_latest = df_africa.groupby('country_full').first().reset_index()
-    
-    df_latest.to_csv(f'{PROCESSED_PATH}/cleaned_fifa_ranking.csv', index=False)
+    # Réduction incrémentale: mémoire bornée par la taille d'un morceau, pas par celle du fichier
+    # Historique complet (classement à une date donnée): écrit au fil des morceaux, dans l'ordre du fichier
+    df_latest = None
+    history_columns = ['country_full', 'rank_date', 'rank', 'total_points']
+    with TableAppender('cleaned_fifa_ranking_history', columns=history_columns) if keep_history else nullcontext() as history:
+        for chunk in iter_fifa_caf_chunks(f'{RAW_PATH}/fifa_ranking-2024-06-20.csv', chunksize):
+            df_latest = latest_per_country(chunk if df_latest is None else pd.concat([df_latest, chunk]))
+            if keep_history:
+                history.append(chunk[history_columns])
+    
+    if df_latest is None:
+        print("⚠️ No CAF rows in the FIFA ranking file")
+        df_latest = pd.DataFrame(columns=list(FIFA_DTYPES))
+    write_table(df_latest, 'cleaned_fifa_ranking')
 
+@timed('cleaning.team_stats')
 def clean_team_stats():
     print("Cleaning: General Stats...")
     df = pd.read_csv(f'{RAW_PATH}/General Statistics For each Participated Team.csv')
     
-    def clean_name(name):
-        if pd.isna(name): return name
-        name = re.sub(r'\s*\[n \d+\]', '', name)
-        return normalize_team_name(name)
-        
-    df['Team'] = df['Team'].apply(clean_name)
+    # Retirer les notes de bas de page ("Egypt  [n 1]")
+    df['Team'] = normalize_team_names(df['Team'].str.replace(r'\s*\[n \d+\]', '', regex=True))
     
     # Convertir GD
-    def convert_gd(gd_str):
-        if pd.isna(gd_str): return 0
-        gd_str = str(gd_str).replace('+', '').replace('−', '-').replace('–', '-')
-        try: return int(gd_str)
-        except: return 0
-        
-    df['GD'] = df['GD'].apply(convert_gd)
+    df['GD'] = convert_goal_difference(df['GD'])
     df['win_rate'] = df['W'] / df['Pld']
     
     # Renommer
     df = df.rename(columns={'Team': 'team', 'Pld': 'games_played', 'GD': 'goal_difference'})
-    df.to_csv(f'{PROCESSED_PATH}/cleaned_team_statistics.csv', index=False)
+    write_table(df, 'cleaned_team_statistics')
 
+@timed('cleaning.champions')
 def clean_champions():
     print("Cleaning: Champions...")
     df = pd.read_csv(f'{RAW_PATH}/Champions.csv')
-    df['Champion'] = df['Champion'].apply(normalize_team_name)
+    df['Champion'] = normalize_team_names(df['Champion'])
     titles_count = df['Champion'].value_counts().to_dict()
     
     df_clean = pd.DataFrame([
         {'team': team, 'can_titles': count} for team, count in titles_count.items()
     ])
-    df_clean.to_csv(f'{PROCESSED_PATH}/cleaned_champions.csv', index=False)
+    write_table(df_clean, 'cleaned_champions')
 
-if __name__ == "__main__":
+def main():
     clean_african_football()
     clean_can_matches()
     clean_fifa_ranking()
     clean_team_stats()
     clean_champions()
-    print("✅ Data cleaning complete.")
\ No newline at end of file
+    print("✅ Data cleaning complete.")
+
+if __name__ == "__main__":
+    with profiling('1_data_cleaning'):
+        main()
+    report("Data cleaning timings")
\ No newline at end of file
@@ -1,158 +1,81 @@
 import pandas as pd
-import numpy as np
-from datetime import datetime
+from storage import read_table, write_table
+from feature_store import FeatureStore, FEATURE_COLUMNS, FEATURE_STORE_PATH
+from instrumentation import timer, report, profiling
 
 PROCESSED_PATH = 'processed_data'
 
-def calculate_last5_stats(df, team_col, date_col):
-    stats = {}
-    for idx, row in df.iterrows():
-        team = row[team_col]
-        match_date = row[date_col]
-        
-        past_matches = df[
-            ((df['team1'] == team) | (df['team2'] == team)) &
-            (df[date_col] < match_date)
-        ].tail(5)
-        
-        if len(past_matches) == 0:
-            stats[idx] = {'points': 7.5, 'goal_diff': 0}
-            continue
-            
-        points = 0
-        goal_diff = 0
-        for _, match in past_matches.iterrows():
-            if match['team1'] == team:
-                points += 3 if match['result'] == 'W' else (1 if match['result'] == 'D' else 0)
-                goal_diff += (match['home_score'] - match['away_score'])
-            else:
-                points += 3 if match['result'] == 'L' else (1 if match['result'] == 'D' else 0)
-                goal_diff += (match['away_score'] - match['home_score'])
-                
-        stats[idx] = {'points': points, 'goal_diff': goal_diff / len(past_matches)}
-    return stats
+# Classement FIFA publié avant la date du match (historique) plutôt que le dernier connu
+FIFA_RANK_AS_OF_MATCH_DATE = False
 
-def calculate_h2h(df):
-    h2h_stats = []
-    for idx, row in df.iterrows():
-        team1, team2, match_date = row['team1'], row['team2'], row['date']
-        
-        past = df[
-            (((df['team1'] == team1) & (df['team2'] == team2)) |
-             ((df['team1'] == team2) & (df['team2'] == team1))) &
-            (df['date'] < match_date)
-        ]
-        
-        total = len(past)
-        if total == 0:
-            h2h_stats.append({'total': 0, 'win_rate': 0.33})
-            continue
-            
-        t1_wins = len(past[((past['team1'] == team1) & (past['result'] == 'W')) | 
-                           ((past['team2'] == team1) & (past['result'] == 'L'))])
-        
-        h2h_stats.append({'total': total, 'win_rate': t1_wins / total})
-    return h2h_stats
-
-def main():
-    print("Loading cleaned datasets...")
-    df_african = pd.read_csv(f'{PROCESSED_PATH}/cleaned_african_football.csv')
-    df_can = pd.read_csv(f'{PROCESSED_PATH}/cleaned_can_matches.csv')
-    df_fifa = pd.read_csv(f'{PROCESSED_PATH}/cleaned_fifa_ranking.csv')
-    df_team_stats = pd.read_csv(f'{PROCESSED_PATH}/cleaned_team_statistics.csv')
-    df_champions = pd.read_csv(f'{PROCESSED_PATH}/cleaned_champions.csv')
-    
-    df_african['date'] = pd.to_datetime(df_african['date'])
-    df_can['Date'] = pd.to_datetime(df_can['Date'])
-    
+def build_base(df_african):
+    """Matchs triés par date (tri stable) avec identifiants et colonnes team1/team2"""
     # Logique de fusion (simplifiée du notebook)
     df_base = df_african.copy()
     # (Optionnel : Ajouter des matchs CAN uniques non présents dans la base de données African Football ici - ignoré pour la concision,
     # suppose que df_african est la liste principale)
     
-    df_base = df_base.sort_values('date').reset_index(drop=True)
+    df_base = df_base.sort_values('date', kind='stable').reset_index(drop=True)
     
     # Fonctionnalités de base
     df_base['match_id'] = range(1, len(df_base) + 1)
-    df_base['team1'] = df_base['home_team']
-    df_base['team2'] = df_base['away_team']
-    
-    # Classement FIFA
-    fifa_dict = dict(zip(df_fifa['country_full'], df_fifa['rank']))
-    df_base['team1_fifa_rank'] = df_base['team1'].map(lambda x: fifa_dict.get(x, 100))
-    df_base['team2_fifa_rank'] = df_base['team2'].map(lambda x: fifa_dict.get(x, 100))
-    df_base['fifa_rank_diff'] = df_base['team1_fifa_rank'] - df_base['team2_fifa_rank']
-    
-    # 5 derniers matchs
-    print("Calculating Last 5 Matches stats...")
-    t1_stats = calculate_last5_stats(df_base, 'team1', 'date')
-    t2_stats = calculate_last5_stats(df_base, 'team2', 'date')
-    
-    df_base['team1_last5_points'] = df_base.index.map(lambda i: t1_stats[i]['points'])
-    df_base['team2_last5_points'] = df_base.index.map(lambda i: t2_stats[i]['points'])
-    df_base['team1_last5_goal_diff'] = df_base.index.map(lambda i: t1_stats[i]['goal_diff'])
-    df_base['team2_last5_goal_diff'] = df_base.index.map(lambda i: t2_stats[i]['goal_diff'])
-    
-    # Statistiques CAN et Titres
-    can_win_dict = dict(zip(df_team_stats['team'], df_team_stats['win_rate']))
-    titles_dict = dict(zip(df_champions['team'], df_champions['can_titles']))
-    
-    df_base['team1_can_win_rate'] = df_base['team1'].map(lambda x: can_win_dict.get(x, 0.35))
-    df_base['team2_can_win_rate'] = df_base['team2'].map(lambda x: can_win_dict.get(x, 0.35))
-    df_base['team1_can_titles'] = df_base['team1'].map(lambda x: titles_dict.get(x, 0))
-    df_base['team2_can_titles'] = df_base['team2'].map(lambda x: titles_dict.get(x, 0))
-    
-    # Face-à-Face (H2H)
-    print("Calculating Head-to-Head stats...")
-    h2h_data = calculate_h2h(df_base)
-    df_base['h2h_total_matches'] = [x['total'] for x in h2h_data]
-    df_base['h2h_team1_win_rate'] = [x['win_rate'] for x in h2h_data]
-    
-    # Hôte & Contexte
-    CAN_HOSTS = {2010:['Angola'], 2012:['Equatorial Guinea','Gabon'], 2013:['South Africa'],
-                 2015:['Equatorial Guinea'], 2017:['Gabon'], 2019:['Egypt'],
-                 2022:['Cameroon'], 2024:['Ivory Coast']}
-    
-    def is_host(team, year):
-        if year in CAN_HOSTS: return team in CAN_HOSTS[year]
-        return False
+    # Chaînes simples (les formats colonnaires stockent les noms en catégories)
+    df_base['team1'] = df_base['home_team'].astype(str)
+    df_base['team2'] = df_base['away_team'].astype(str)
+    return df_base
 
-    df_base['team1_is_host'] = df_base.apply(lambda x: 1 if is_host(x['team1'], x['year']) else 0, axis=1)
-    df_base['team2_is_host'] = df_base.apply(lambda x: 1 if is_host(x['team2'], x['year']) else 0, axis=1)
-    
-    # Étape (Groupe vs Éliminatoire / Finales)
-    if 'tournament' in df_base.columns:
-        is_can = df_base['tournament'].str.contains('African Cup Of Nations|CAN', case=False, na=False)
-        is_qualif = df_base['tournament'].str.contains('Qualif', case=False, na=False)
-        df_base['stage_group'] = np.where(is_can & ~is_qualif, 1, 0)
-    else:
-        df_base['stage_group'] = 0
+def final_dataset(df_base, features):
+    """Sélection finale"""
+    df_base = df_base.copy()
+    df_base[features.columns] = features
+    final_cols = ['match_id', 'date', 'team1', 'team2'] + FEATURE_COLUMNS + ['result']
+    return df_base[final_cols].copy()
 
-    # Jours depuis le dernier match (Simplifié pour la vitesse)
-    df_base['days_since_last_match_team1'] = 7 # Default
-    df_base['days_since_last_match_team2'] = 7 # Default
-    
-    # Fonctionnalités composites
-    df_base['form_momentum_diff'] = df_base['team1_last5_goal_diff'] - df_base['team2_last5_goal_diff']
-    df_base['can_performance_diff'] = df_base['team1_can_win_rate'] - df_base['team2_can_win_rate']
-    df_base['h2h_dominance'] = df_base['h2h_team1_win_rate'] - 0.5
-    df_base['titles_advantage'] = df_base['team1_can_titles'] - df_base['team2_can_titles']
-    
-    # Sélection finale
-    final_cols = [
-        'match_id', 'date', 'team1', 'team2', 'fifa_rank_diff', 
-        'team1_last5_points', 'team2_last5_points', 'team1_last5_goal_diff', 'team2_last5_goal_diff',
-        'team1_can_win_rate', 'team2_can_win_rate', 'h2h_total_matches', 'h2h_team1_win_rate',
-        'team1_is_host', 'team2_is_host', 'stage_group', 
-        'days_since_last_match_team1', 'days_since_last_match_team2',
-        'team1_can_titles', 'team2_can_titles',
-        'form_momentum_diff', 'can_performance_diff', 'h2h_dominance', 'titles_advantage',
-        'result'
-    ]
-    
-    df_final = df_base[final_cols].copy()
-    df_final.to_csv(f'{PROCESSED_PATH}/final_dataset_for_modeling.csv', index=False)
+def main():
+    print("Loading cleaned datasets...")
+    df_african = read_table('cleaned_african_football')
+    df_fifa = read_table('cleaned_fifa_ranking')
+    df_team_stats = read_table('cleaned_team_statistics')
+    df_champions = read_table('cleaned_champions')
+    df_fifa_history = read_table('cleaned_fifa_ranking_history')
+    
+    df_base = build_base(df_african)
+    
+    # Toutes les fonctionnalités viennent du feature store, calculées à la date de chaque match
+    # (le même store sert les fonctionnalités en direct dans 4_simulation_lib.py)
+    with timer('features.build_store'):
+        store = FeatureStore.from_tables(
+            df_base, df_fifa, df_team_stats, df_champions, df_fifa_history,
+            window=5, fifa_point_in_time=FIFA_RANK_AS_OF_MATCH_DATE
+        )
+    for line in store.unmatched_report():
+        print(f"⚠️ Unmatched team names in {line}")
+    features = store.match_features(df_base)
+    store.save(FEATURE_STORE_PATH)
+    
+    write_table(final_dataset(df_base, features), 'final_dataset_for_modeling')
     print("✅ Feature engineering complete. Dataset saved.")
 
+def update(n_previous):
+    """Mode incrémental: calcule les fonctionnalités des seuls matchs ajoutés après les
+    `n_previous` premiers de cleaned_african_football (tous postérieurs aux anciens).
+    Les fonctionnalités ne dépendent que des matchs antérieurs: les lignes existantes ne changent pas."""
+    print("Loading cleaned datasets (incremental)...")
+    df_base = build_base(read_table('cleaned_african_football'))
+    df_new = df_base.iloc[n_previous:]
+    
+    store = FeatureStore.load(FEATURE_STORE_PATH)
+    for row in df_new.itertuples(index=False):
+        store.add_match(row.team1, row.team2, row.date, row.home_score, row.away_score,
+                        getattr(row, 'tournament', None))
+    features = store.match_features(df_new)
+    store.save(FEATURE_STORE_PATH)
+    
+    df_final = pd.concat([read_table('final_dataset_for_modeling'), final_dataset(df_new, features)], ignore_index=True)
+    write_table(df_final, 'final_dataset_for_modeling')
+    print(f"✅ Feature engineering updated: {len(df_new)} new matches.")
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with profiling('2_feature_engineering'):
+        main()
+    report("Feature engineering timings")
\ No newline at end of file
@@ -1,27 +1,169 @@
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split, RandomizedSearchCV
+from sklearn.model_selection import ParameterSampler, TimeSeriesSplit
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import StandardScaler, LabelEncoder
+from sklearn.metrics import accuracy_score, f1_score
+from joblib import Parallel, delayed
 import joblib
+import argparse
+import hashlib
+import json
+import math
 import os
+import time
+from storage import read_table
+from instrumentation import timer, timed, report, profiling
+from forest_engine import FlatForest, load_forest_arrays, verify_against_sklearn
 
 PROCESSED_PATH = 'processed_data'
 MODELS_PATH = 'models'
 os.makedirs(MODELS_PATH, exist_ok=True)
 
-def train():
-    print("Loading dataset...")
-    df = pd.read_csv(f'{PROCESSED_PATH}/final_dataset_for_modeling.csv')
+FOREST_ARRAYS_PATH = f'{MODELS_PATH}/rf_forest'
+TRIALS_LOG_PATH = f'{MODELS_PATH}/search_trials.jsonl'
+TRAINING_REPORT_PATH = f'{MODELS_PATH}/training_report.json'
+
+# Recherche par divisions successives: le nombre d'arbres est la ressource,
+# chaque tour garde le meilleur tiers des candidats et triple les arbres
+PARAM_SPACE = {
+    'max_depth': [5, 10, 15],
+    'min_samples_split': [5, 10],
+    'min_samples_leaf': [2, 5]
+}
+N_CANDIDATES = 12
+MAX_TREES = 200
+HALVING_FACTOR = 3
+CV_SPLITS = 3
+TEST_FRACTION = 0.2  # derniers matchs (chronologiquement) réservés au test
+
+def export_forest_arrays(model, scaler, path=FOREST_ARRAYS_PATH):
+    """Exporte la forêt sous sa forme de service (indices globaux, seuils normalisés intégrés)
+    en tableaux .npy non compressés, utilisés tels quels avec mmap_mode='r' par l'API"""
+    forest = FlatForest.from_model(model, scaler)
+    forest.save(path)
+    return forest
+
+def artifact_size(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+    return os.path.getsize(path)
+
+def report_artifacts(compressed_path=None):
+    """Affiche la taille et le temps de chargement de chaque forme d'artefact"""
+    loaders = [
+        ('rf_model.joblib', f'{MODELS_PATH}/rf_model.joblib', lambda p: joblib.load(p)),
+        ('rf_forest/*.npy (mmap)', FOREST_ARRAYS_PATH, lambda p: load_forest_arrays(p)),
+    ]
+    if compressed_path:
+        loaders.append((os.path.basename(compressed_path), compressed_path, lambda p: joblib.load(p)))
+    print("Artifact report:")
+    for label, path, loader in loaders:
+        start = time.perf_counter()
+        loader(path)
+        elapsed = time.perf_counter() - start
+        print(f"  {label:<28} {artifact_size(path) / 1e6:8.2f} MB  load {elapsed * 1000:8.1f} ms")
+
+def time_split(df, test_fraction=TEST_FRACTION):
+    """Division chronologique: les matchs les plus récents servent de test"""
+    df = df.sort_values('date', kind='stable').reset_index(drop=True)
+    n_train = int(round(len(df) * (1 - test_fraction)))
+    return df.iloc[:n_train], df.iloc[n_train:]
+
+def halving_schedule(n_candidates, max_resources=MAX_TREES, factor=HALVING_FACTOR):
+    """Liste de (nombre de candidats, nombre d'arbres) par tour"""
+    n_rounds = int(math.log(n_candidates, factor)) + 1
+    schedule = []
+    for i in range(n_rounds):
+        trees = max(1, int(round(max_resources / factor ** (n_rounds - 1 - i))))
+        schedule.append((n_candidates, trees))
+        n_candidates = max(1, math.ceil(n_candidates / factor))
+    return schedule
+
+def data_fingerprint(X, y):
+    """Empreinte des données d'entraînement: un essai n'est réutilisé que sur les mêmes données"""
+    digest = hashlib.sha256(np.ascontiguousarray(X).tobytes())
+    digest.update(np.ascontiguousarray(y).tobytes())
+    return digest.hexdigest()[:16]
+
+def trial_key(params, n_estimators, fold, fingerprint):
+    payload = json.dumps({'params': params, 'n_estimators': n_estimators, 'fold': fold,
+                          'cv_splits': CV_SPLITS, 'data': fingerprint}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+def load_trials(path=TRIALS_LOG_PATH):
+    """Journal persistant des essais déjà évalués: {clé: score}"""
+    trials = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # ligne tronquée par une interruption
+                trials[entry['key']] = entry['score']
+        # Terminer une dernière ligne incomplète pour que les ajouts suivants restent lisibles
+        with open(path, 'rb+') as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    f.write(b'\n')
+    return trials
+
+def fit_fold(X, y, params, n_estimators, train_idx, val_idx):
+    """Score f1_macro d'un candidat sur un pli (forêt mono-thread: le parallélisme est au niveau des essais)"""
+    model = RandomForestClassifier(n_estimators=n_estimators, class_weight='balanced',
+                                   random_state=42, n_jobs=1, **params)
+    model.fit(X[train_idx], y[train_idx])
+    return f1_score(y[val_idx], model.predict(X[val_idx]), average='macro')
+
+def successive_halving(X, y, n_jobs=-1, log_path=TRIALS_LOG_PATH):
+    """Recherche d'hyperparamètres par divisions successives, reprenable:
+    les essais (candidat, arbres, pli) déjà présents dans le journal ne sont pas recalculés.
+    Retourne (meilleurs paramètres, score CV)."""
+    candidates = list(ParameterSampler(PARAM_SPACE, n_iter=N_CANDIDATES, random_state=42))
+    folds = list(TimeSeriesSplit(n_splits=CV_SPLITS).split(X))
+    fingerprint = data_fingerprint(X, y)
+    trials = load_trials(log_path)
     
-    # Séparer les fonctionnalités et la cible
-    X = df.drop(['result', 'match_id', 'date', 'team1', 'team2'], axis=1)
-    y = df['result']
+    with open(log_path, 'a') as log:
+        for round_idx, (n_keep, n_estimators) in enumerate(halving_schedule(len(candidates))):
+            candidates = candidates[:n_keep]
+            tasks = [(c, f) for c in range(len(candidates)) for f in range(len(folds))]
+            keys = {(c, f): trial_key(candidates[c], n_estimators, f, fingerprint) for c, f in tasks}
+            todo = [(c, f) for c, f in tasks if keys[c, f] not in trials]
+            
+            scores = Parallel(n_jobs=n_jobs, return_as='generator')(
+                delayed(fit_fold)(X, y, candidates[c], n_estimators, *folds[f]) for c, f in todo
+            )
+            for (c, f), score in zip(todo, scores):
+                trials[keys[c, f]] = score
+                log.write(json.dumps({'key': keys[c, f], 'params': candidates[c], 'n_estimators': n_estimators,
+                                      'fold': f, 'score': score}) + '\n')
+                log.flush()
+            
+            mean_scores = [np.mean([trials[keys[c, f]] for f in range(len(folds))]) for c in range(len(candidates))]
+            order = np.argsort(mean_scores, kind='stable')[::-1]
+            candidates = [candidates[c] for c in order]
+            best_score = mean_scores[order[0]]
+            print(f"  round {round_idx + 1}: {len(mean_scores)} candidates x {n_estimators} trees "
+                  f"({len(tasks) - len(todo)}/{len(tasks)} fits from log), best f1_macro {best_score:.4f}")
     
-    # Division
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, stratify=y, random_state=42
-    )
+    return {**candidates[0], 'n_estimators': n_estimators}, best_score
+
+@timed('train.total')
+def train(compress=False, n_jobs=-1):
+    start = time.perf_counter()
+    print("Loading dataset...")
+    df = read_table('final_dataset_for_modeling')
+    
+    # Division chronologique (pas de matchs futurs dans l'entraînement)
+    df_train, df_test = time_split(df)
+    drop_cols = ['result', 'match_id', 'date', 'team1', 'team2']
+    X_train, y_train = df_train.drop(drop_cols, axis=1), df_train['result']
+    X_test, y_test = df_test.drop(drop_cols, axis=1), df_test['result']
+    print(f"Train: {len(df_train)} matches until {df_train['date'].max():%Y-%m-%d}, test: {len(df_test)} matches")
     
     # Pré-traitement
     print("Preprocessing data...")
@@ -31,33 +173,59 @@ def train():
     label_encoder = LabelEncoder()
     y_train_encoded = label_encoder.fit_transform(y_train)
     
-    # Optimisation (RandomizedSearchCV)
-    print("Optimizing Random Forest...")
-    rf = RandomForestClassifier(class_weight='balanced', random_state=42, n_jobs=-1)
-    
-    params = {
-        'n_estimators': [100, 200],
-        'max_depth': [5, 10, 15],
-        'min_samples_split': [5, 10],
-        'min_samples_leaf': [2, 5]
-    }
+    # Optimisation (divisions successives sur le nombre d'arbres)
+    print("Optimizing Random Forest (successive halving)...")
+    with timer('train.search_fit'):
+        best_params, best_score = successive_halving(X_train_scaled, y_train_encoded, n_jobs=n_jobs)
+    print(f"Best Score: {best_score:.4f}")
+    print(f"Best Config: {best_params}")
     
-    search = RandomizedSearchCV(rf, params, n_iter=10, cv=3, scoring='f1_macro', n_jobs=-1, random_state=42)
-    search.fit(X_train_scaled, y_train_encoded)
+    # Réentraînement du meilleur candidat: ici le parallélisme est dans la forêt
+    best_model = RandomForestClassifier(class_weight='balanced', random_state=42, n_jobs=n_jobs, **best_params)
+    best_model.fit(X_train_scaled, y_train_encoded)
+    # Service: prédictions de quelques lignes, un pool de threads par appel coûte plus qu'il ne rapporte
+    best_model.n_jobs = 1
     
-    best_model = search.best_estimator_
-    print(f"Best Score: {search.best_score_:.4f}")
+    y_pred = label_encoder.inverse_transform(best_model.predict(scaler.transform(X_test)))
+    test_scores = {'f1_macro': f1_score(y_test, y_pred, average='macro'), 'accuracy': accuracy_score(y_test, y_pred)}
+    print(f"Test (most recent {len(df_test)} matches): f1_macro {test_scores['f1_macro']:.4f}, accuracy {test_scores['accuracy']:.4f}")
     
     # Sauvegarde des artefacts
     print("Saving models...")
+    # Non compressé: chargement le plus rapide
     joblib.dump(best_model, f'{MODELS_PATH}/rf_model.joblib')
+    export_forest_arrays(best_model, scaler)
+    # Le moteur aplati (seuils normalisés intégrés), relu depuis le disque, doit reproduire sklearn sur tout le jeu
+    diff = verify_against_sklearn(FlatForest.load(FOREST_ARRAYS_PATH), best_model, scaler,
+                                  pd.concat([X_train, X_test]))
+    print(f"Flat forest engine matches sklearn (max |dp| = {diff:.1e})")
+    compressed_path = None
+    if compress:
+        # Variante compressée pour la distribution (non mappable en mémoire)
+        compressed_path = f'{MODELS_PATH}/rf_model.compressed.joblib'
+        joblib.dump(best_model, compressed_path, compress=('xz', 3))
     joblib.dump(scaler, f'{MODELS_PATH}/scaler.joblib')
     joblib.dump(label_encoder, f'{MODELS_PATH}/label_encoder.joblib')
     
     # Sauvegarder les noms des fonctionnalités pour l'inférence plus tard
-    joblib.dump(X.columns.tolist(), f'{MODELS_PATH}/feature_names.joblib')
+    joblib.dump(X_train.columns.tolist(), f'{MODELS_PATH}/feature_names.joblib')
     
+    report_artifacts(compressed_path)
+    wall_time = time.perf_counter() - start
+    with open(TRAINING_REPORT_PATH, 'w') as f:
+        json.dump({'best_params': best_params, 'cv_f1_macro': best_score, 'test': test_scores,
+                   'n_train': len(df_train), 'n_test': len(df_test), 'wall_time_s': wall_time}, f, indent=2)
+    print(f"Training wall time: {wall_time:.1f} s")
     print("✅ Training complete. Models saved in /models")
 
 if __name__ == "__main__":
-    train()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Train the CAN 2025 Random Forest")
+    parser.add_argument('--compress', action='store_true', help="also write a compressed model for shipping")
+    parser.add_argument('--jobs', type=int, default=-1, help="parallel fits during the search (default: all cores)")
+    parser.add_argument('--fresh', action='store_true', help="ignore the trial log and re-evaluate every configuration")
+    args = parser.parse_args()
+    if args.fresh and os.path.exists(TRIALS_LOG_PATH):
+        os.remove(TRIALS_LOG_PATH)
+    with profiling('3_train_model'):
+        train(compress=args.compress, n_jobs=args.jobs)
+    report("Training timings")
\ No newline at end of file
@@ -1,23 +1,184 @@
 import pandas as pd
 import numpy as np
 import joblib
+import os
+import json
+import hashlib
+import threading
+import time
 from datetime import datetime
+from feature_store import FeatureStore
+from storage import FORMATS
+from instrumentation import timer, timed, report, profiling
+from forest_engine import FlatForest, FOREST_ARRAY_NAMES
+import tournament_format
+from team_registry import canonical_name
 
 # Paths
 MODELS_PATH = 'models'
 PROCESSED_PATH = 'processed_data'
 
-# Load artifacts (Global variables to load once)
-try:
-    model = joblib.load(f'{MODELS_PATH}/rf_model.joblib')
-    scaler = joblib.load(f'{MODELS_PATH}/scaler.joblib')
-    label_encoder = joblib.load(f'{MODELS_PATH}/label_encoder.joblib')
-    feature_names = joblib.load(f'{MODELS_PATH}/feature_names.joblib')
-    # Charger les données historiques pour le calcul dynamique des fonctionnalités
-    history_df = pd.read_csv(f'{PROCESSED_PATH}/final_dataset_for_modeling.csv')
-    history_df['date'] = pd.to_datetime(history_df['date'])
-except Exception as e:
-    print(f"⚠️ Warning: Could not load models. Make sure you ran scripts 1-3. Error: {e}")
+# Inférence par le moteur aplati (forest_engine.py) plutôt que par sklearn
+USE_FLAT_FOREST = os.environ.get('CAN_FLAT_FOREST', '1') == '1'
+
+MODEL_ARTIFACTS = ['rf_model.joblib', 'scaler.joblib', 'label_encoder.joblib', 'feature_names.joblib', 'feature_store.joblib']
+# Tableaux de la forêt aplatie: ce sont eux qui servent les prédictions
+MODEL_ARTIFACTS += [f'rf_forest/{name}.npy' for name in FOREST_ARRAY_NAMES]
+
+def artifacts_version(models_path=MODELS_PATH, processed_path=PROCESSED_PATH):
+    """Version des artefacts (taille + date de modification): change si le modèle ou l'historique change"""
+    paths = {name: f'{models_path}/{name}' for name in MODEL_ARTIFACTS}
+    paths.update({f'final_dataset_for_modeling{ext}': f'{processed_path}/final_dataset_for_modeling{ext}'
+                  for ext in FORMATS.values()})
+    stamps = []
+    for name, path in paths.items():
+        if os.path.exists(path):
+            stat = os.stat(path)
+            stamps.append(f'{name}:{stat.st_size}:{stat.st_mtime_ns}')
+    return '|'.join(stamps)
+
+class ModelArtifacts:
+    """Instantané cohérent des artefacts chargés (modèle + feature store)"""
+
+    def __init__(self, models_path=MODELS_PATH, processed_path=PROCESSED_PATH):
+        self.scaler = joblib.load(f'{models_path}/scaler.joblib')
+        self.label_encoder = joblib.load(f'{models_path}/label_encoder.joblib')
+        self.feature_names = joblib.load(f'{models_path}/feature_names.joblib')
+        # Forêt aplatie exportée sous forme de service, mappée en mémoire (pages partagées
+        # entre les workers). None: repli sur sklearn
+        forest_path = f'{models_path}/rf_forest'
+        self.forest = FlatForest.load(forest_path) if USE_FLAT_FOREST and FlatForest.exists(forest_path) else None
+        if USE_FLAT_FOREST and self.forest is None:
+            print(f"⚠️ Flat forest arrays missing or outdated in {forest_path}, serving with sklearn "
+                  f"(re-run 3_train_model.py)")
+        self.engine = 'flat' if self.forest is not None else 'sklearn'
+        self._model_path = f'{models_path}/rf_model.joblib'
+        self._model = None
+        if self.forest is None:
+            self._model = self._load_model()
+        # Feature store (état par équipe à date) construit par 2_feature_engineering.py
+        self.feature_store = FeatureStore.load(f'{models_path}/feature_store.joblib')
+        # Version de cet instantané (fixée par le registre, suit les matchs joués en direct)
+        self.version = None
+
+    def _load_model(self):
+        # Chargement simple: les arbres sklearn recopient leurs tableaux de nœuds à la
+        # désérialisation, mmap_mode ne partagerait aucune page et ralentirait le chargement
+        return joblib.load(self._model_path)
+
+    @property
+    def model(self):
+        """Modèle sklearn: chargé d'emblée sans forêt aplatie, sinon seulement au premier usage (benchmarks)"""
+        if self._model is None:
+            self._model = self._load_model()
+        return self._model
+
+class ModelRegistry:
+    """Registre du modèle: chargement paresseux au premier usage, état de disponibilité,
+    préchauffage à la demande et rechargement à chaud d'une nouvelle version.
+    Les matchs joués pendant le tournoi sont rejoués sur le feature store à chaque chargement."""
+
+    def __init__(self, models_path=MODELS_PATH, processed_path=PROCESSED_PATH):
+        self.models_path = models_path
+        self.processed_path = processed_path
+        self._artifacts = None
+        self._lock = threading.Lock()
+        self.base_version = None
+        # Matchs du tournoi en cours (team1, team2, date, score1, score2, tournoi), hors artefacts
+        self.live_matches = []
+        self.loaded_at = None
+        self.load_seconds = None
+        self.error = None
+
+    @property
+    def ready(self):
+        return self._artifacts is not None
+
+    @property
+    def version(self):
+        """Version de l'instantané en service; préférer `get().version` pour l'associer à ses artefacts"""
+        artifacts = self._artifacts
+        return artifacts.version if artifacts is not None else None
+
+    def _load(self):
+        start = time.perf_counter()
+        version = artifacts_version(self.models_path, self.processed_path)
+        try:
+            artifacts = ModelArtifacts(self.models_path, self.processed_path)
+        except Exception as e:
+            self.error = str(e)
+            raise RuntimeError(f"Could not load models. Make sure you ran scripts 1-3. Error: {e}") from e
+        for match in self.live_matches:
+            artifacts.feature_store.add_match(*match)
+        self.base_version = version
+        artifacts.version = self._live_version()
+        # Remplacement atomique: les requêtes en cours gardent l'ancien instantané
+        self._artifacts = artifacts
+        self.loaded_at = datetime.now()
+        self.load_seconds = time.perf_counter() - start
+        self.error = None
+        return artifacts
+
+    def get(self):
+        """Artefacts courants, chargés au premier appel"""
+        artifacts = self._artifacts
+        if artifacts is not None:
+            return artifacts
+        with self._lock:
+            return self._artifacts or self._load()
+
+    def _live_version(self):
+        # La version dépend du contenu des résultats (pas seulement de leur nombre): les caches
+        # (API, tenseur de probabilités) ne sont jamais partagés entre deux états différents
+        if not self.live_matches:
+            return self.base_version
+        played = [(str(pd.Timestamp(date).date()), t1, t2, int(s1), int(s2)) for t1, t2, date, s1, s2, _ in self.live_matches]
+        return f"{self.base_version}+live-{hashlib.sha1(repr(played).encode()).hexdigest()[:12]}"
+
+    def add_live_match(self, team1, team2, date, home_score, away_score, tournament=None):
+        """Ajoute un match joué à l'état en service (forme, Elo, face-à-face, repos).
+        Sous le verrou du registre: un rechargement concurrent ne peut pas perdre le match."""
+        with self._lock:
+            artifacts = self._artifacts or self._load()
+            match = (team1, team2, date, home_score, away_score, tournament)
+            artifacts.feature_store.add_match(*match)
+            self.live_matches.append(match)
+            artifacts.version = self._live_version()
+
+    def warm_up(self):
+        """Charge les artefacts et exécute une prédiction pour amorcer les caches"""
+        self.get()
+        predict_match('Maroc', 'Sénégal')
+        return self.status()
+
+    def reload(self):
+        """Recharge les artefacts depuis le disque (nouvelle version) sans redémarrer.
+        En cas d'échec, l'ancienne version reste en service."""
+        with self._lock:
+            self._load()
+        return self.status()
+
+    def status(self):
+        return {
+            'ready': self.ready,
+            'version': self.version,
+            # Moteur d'inférence en service: 'flat' (forêt aplatie) ou 'sklearn' (repli)
+            'engine': self._artifacts.engine if self.ready else None,
+            'live_matches': len(self.live_matches),
+            # Noms d'équipes inconnus reçus en service (nom -> nombre de requêtes)
+            'unmatched_teams': dict(self._artifacts.feature_store.registry.unmatched) if self.ready else {},
+            'loaded_at': self.loaded_at.isoformat() if self.loaded_at else None,
+            'load_seconds': self.load_seconds,
+            'error': self.error,
+        }
+
+    def __getattr__(self, name):
+        # registry.model, registry.scaler, ... délèguent à l'instantané courant
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.get(), name)
+
+registry = ModelRegistry()
 
 # Données statiques pour la CAN 2025
 FIFA_RANKING = {
@@ -27,134 +188,458 @@ FIFA_RANKING = {
     'Bénin': 91, 'Tanzanie': 105, 'Mozambique': 108, 'Soudan': 123
 }
 
-CAN_TITLES = {
-    'Égypte': 7, 'Cameroun': 5, 'Nigeria': 3, "Côte d'Ivoire": 3,
-    'Algérie': 2, 'RD Congo': 2, 'Sénégal': 1, 'Tunisie': 1, 'Maroc': 1,
-    'Afrique du Sud': 1, 'Soudan': 1, 'Mali': 0, 'Burkina Faso': 0, 
-    'Bénin': 0, 'Tanzanie': 0, 'Mozambique': 0
-}
-
 HOST_COUNTRY = 'Maroc'
-TEAM_NAME_MAPPING = {
-    'Maroc': 'Morocco', 'Égypte': 'Egypt', "Côte d'Ivoire": 'Ivory Coast',
-    'Afrique du Sud': 'South Africa', 'RD Congo': 'DR Congo',
-    'Algérie': 'Algeria', 'Burkina Faso': 'Burkina Faso',
-    'Tanzanie': 'Tanzania', 'Mozambique': 'Mozambique',
-    'Mali': 'Mali', 'Tunisie': 'Tunisia',
-    'Nigeria': 'Nigeria', 'Sénégal': 'Senegal',
-    'Cameroun': 'Cameroon', 'Bénin': 'Benin', 'Soudan': 'Sudan'
-}
 
 def get_mapped_name(team):
-    return TEAM_NAME_MAPPING.get(team, team)
+    """Nom canonique (registre des équipes: noms français, variantes, noms historiques)"""
+    return canonical_name(team)
+
+def fixture_date(date=None):
+    """Date du match (repos, fatigue): celle fournie, sinon aujourd'hui"""
+    return pd.Timestamp(date if date is not None else pd.Timestamp.today()).normalize()
+
+def build_feature_row(team1, team2, as_of=None, artifacts=None, match_date=None):
+    """Dictionnaire des fonctionnalités pour deux équipes, calculé par le feature store
+    avec exactement la même logique qu'à l'entraînement (repos mesuré à `match_date`)"""
+    return (artifacts or registry.get()).feature_store.live_features(
+        get_mapped_name(team1), get_mapped_name(team2), as_of=as_of,
+        host=get_mapped_name(HOST_COUNTRY), stage_group=1, # Assumed tournament context
+        match_date=fixture_date(match_date if match_date is not None else as_of)
+    )
 
-def get_live_features(team1, team2):
+def team_rating(team):
+    """Classement Elo courant (état persisté du feature store, mis à jour match par match)"""
+    return registry.feature_store.rating(get_mapped_name(team))
+
+@timed('predict.get_live_features')
+def get_live_features(team1, team2, match_date=None):
     """Calcule les fonctionnalités pour deux équipes basées sur l'histoire + données statiques"""
-    t1_map = get_mapped_name(team1)
-    t2_map = get_mapped_name(team2)
-    
-    # 1. Forme récente (5 derniers)
-    def get_last5(t_name):
-        matches = history_df[
-            (history_df['team1'] == t_name) | (history_df['team2'] == t_name)
-        ].sort_values('date', ascending=False).head(5)
-        if matches.empty: return 7.5, 0
-        
-        pts, gd = 0, 0
-        for _, m in matches.iterrows():
-            if m['team1'] == t_name:
-                pts += 3 if m['result'] == 'W' else (1 if m['result'] == 'D' else 0)
-                gd += m['team1_last5_goal_diff'] # approximation
-            else:
-                pts += 3 if m['result'] == 'L' else (1 if m['result'] == 'D' else 0)
-                gd += m['team2_last5_goal_diff']
-        return pts, gd/len(matches)
-
-    p1, gd1 = get_last5(t1_map)
-    p2, gd2 = get_last5(t2_map)
-    
-    # 2. H2H
-    h2h = history_df[
-        ((history_df['team1'] == t1_map) & (history_df['team2'] == t2_map)) |
-        ((history_df['team1'] == t2_map) & (history_df['team2'] == t1_map))
-    ]
-    h2h_total = len(h2h)
-    if h2h_total > 0:
-        t1_wins = len(h2h[((h2h['team1'] == t1_map) & (h2h['result'] == 'W')) | 
-                          ((h2h['team2'] == t1_map) & (h2h['result'] == 'L'))])
-        h2h_rate = t1_wins / h2h_total
-    else:
-        h2h_rate = 0.33
-
-    # 3. Taux de victoire CAN (Approximation de l'histoire statique)
-    def get_can_rate(t_name):
-        return 0.4 + (CAN_TITLES.get(team1, 0) * 0.05) # Simplified logic
-
-    # Construire le dictionnaire
-    features = {
-        'fifa_rank_diff': FIFA_RANKING.get(team1, 100) - FIFA_RANKING.get(team2, 100),
-        'team1_last5_points': p1, 'team2_last5_points': p2,
-        'team1_last5_goal_diff': gd1, 'team2_last5_goal_diff': gd2,
-        'team1_can_win_rate': get_can_rate(t1_map), 'team2_can_win_rate': get_can_rate(t2_map),
-        'h2h_total_matches': h2h_total, 'h2h_team1_win_rate': h2h_rate,
-        'team1_is_host': 1 if team1 == HOST_COUNTRY else 0,
-        'team2_is_host': 1 if team2 == HOST_COUNTRY else 0,
-        'stage_group': 1, # Assumed tournament context
-        'days_since_last_match_team1': 4,
-        'days_since_last_match_team2': 4,
-        'team1_can_titles': CAN_TITLES.get(team1, 0),
-        'team2_can_titles': CAN_TITLES.get(team2, 0),
-        'form_momentum_diff': p1 - p2,
-        'can_performance_diff': 0, # Placeholder
-        'h2h_dominance': h2h_rate - 0.5,
-        'titles_advantage': CAN_TITLES.get(team1, 0) - CAN_TITLES.get(team2, 0)
-    }
-    
     # Assurer le bon ordre
-    return pd.DataFrame([features])[feature_names]
+    return pd.DataFrame([build_feature_row(team1, team2, match_date=match_date)])[registry.feature_names]
 
-def predict_match(team1, team2):
-    """Prédit le vainqueur entre deux équipes"""
-    X = get_live_features(team1, team2)
-    X_scaled = scaler.transform(X)
+def get_live_features_batch(pairs, artifacts=None, match_date=None):
+    """Matrice de fonctionnalités pour une liste de paires (team1, team2) jouées à `match_date`"""
+    artifacts = artifacts or registry.get()
+    match_date = fixture_date(match_date)
+    rows = [build_feature_row(t1, t2, artifacts=artifacts, match_date=match_date) for t1, t2 in pairs]
+    return pd.DataFrame(rows, columns=artifacts.feature_names)
+
+def decide_winner(team1, team2, probs, classes):
+    """Vainqueur prédit (argmax) à partir des probabilités W/D/L de team1"""
+    result = classes[np.argmax(probs)]
+    if result == 'W': return team1
+    elif result == 'L': return team2
+    else: return 'Draw'
+
+def predict_matches(pairs, artifacts=None, match_date=None):
+    """Prédit plusieurs matchs avec une seule matrice et un seul appel à predict_proba.
+    Retourne une liste de (vainqueur, probabilités) dans l'ordre des paires.
+    `artifacts`: instantané à utiliser (par défaut celui en service).
+    `match_date`: date des matchs (par défaut aujourd'hui)."""
+    pairs = list(pairs)
+    if not pairs: return []
+    for t1, t2 in pairs:
+        if get_mapped_name(t1) == get_mapped_name(t2):
+            raise ValueError(f"A team cannot play itself: {t1!r} vs {t2!r}")
+    artifacts = artifacts or registry.get()
+    with timer('predict.features'):
+        X = get_live_features_batch(pairs, artifacts, match_date)
     
     # Probabilités
-    probs = model.predict_proba(X_scaled)[0]
-    classes = label_encoder.classes_
-    prob_dict = dict(zip(classes, probs))
-    
-    # Prédiction
-    pred_idx = np.argmax(probs)
-    result = classes[pred_idx]
-    
-    if result == 'W': return team1, prob_dict
-    elif result == 'L': return team2, prob_dict
-    else: return 'Draw', prob_dict
-
-def simulate_tournament():
-    """Simule le tableau 2025 défini dans le notebook"""
-    bracket_16 = [
-        ('Sénégal', 'Soudan'), ('Mali', 'Tunisie'),
-        ('Maroc', 'Tanzanie'), ('Afrique du Sud', 'Cameroun'),
-        ('Égypte', 'Bénin'), ('Nigeria', 'Mozambique'),
-        ('Algérie', 'RD Congo'), ("Côte d'Ivoire", 'Burkina Faso')
+    if artifacts.forest is not None:
+        with timer('predict.flat_forest'):
+            all_probs = artifacts.forest.predict_proba(X.to_numpy(dtype=float))
+    else:
+        with timer('predict.scaling'):
+            X_scaled = artifacts.scaler.transform(X)
+        with timer('predict.predict_proba'):
+            all_probs = artifacts.model.predict_proba(X_scaled)
+    classes = artifacts.label_encoder.classes_
+    return [
+        (decide_winner(t1, t2, probs, classes), dict(zip(classes, probs)))
+        for (t1, t2), probs in zip(pairs, all_probs)
     ]
+
+def predict_match(team1, team2, match_date=None):
+    """Prédit le vainqueur entre deux équipes"""
+    return predict_matches([(team1, team2)], match_date=match_date)[0]
+
+# Tenseur des probabilités par paire: probs[i, j] = (W, D, L) pour teams[i] contre teams[j]
+OUTCOMES = ['W', 'D', 'L']
+PROBA_MATRIX_PATH = f'{MODELS_PATH}/proba_matrix.joblib'
+def build_probability_matrix(teams, artifacts=None, match_date=None):
+    """Calcule le tenseur N×N×3 (W/D/L) avec un seul appel batch au modèle"""
+    n = len(teams)
+    pairs = [(teams[i], teams[j]) for i in range(n) for j in range(n) if i != j]
+    probs = np.full((n, n, 3), np.nan)
+    for (t1, t2), (_, prob_dict) in zip(pairs, predict_matches(pairs, artifacts, match_date)):
+        probs[teams.index(t1), teams.index(t2)] = [prob_dict.get(o, 0.0) for o in OUTCOMES]
+    return probs
+
+# Lecture-fusion-écriture du cache sérialisée dans le processus (pas de tenseur perdu entre threads)
+proba_matrix_lock = threading.Lock()
+
+def get_probability_matrix(teams, path=PROBA_MATRIX_PATH, match_date=None):
+    """Tenseur de probabilités en cache: reconstruit seulement si les artefacts changent.
+    Un tenseur par liste d'équipes (tableau des huitièmes, format complet à 24 équipes...)
+    et par date des matchs (repos et fatigue, par défaut aujourd'hui)."""
+    teams = list(teams)
+    match_date = fixture_date(match_date)
+    key = (tuple(teams), str(match_date.date()))
+    artifacts = registry.get()
+    version = artifacts.version
+    with proba_matrix_lock:
+        matrices = {}
+        if os.path.exists(path):
+            try:
+                cached = joblib.load(path)
+            except Exception as e:
+                # Fichier tronqué ou illisible: simple cache, on le recalcule
+                print(f"⚠️ Ignoring unreadable probability cache {path}: {e}")
+                cached = {}
+            if cached.get('version') == version:
+                matrices = cached.get('matrices', {})
+        if key not in matrices:
+            matrices[key] = build_probability_matrix(teams, artifacts, match_date)
+            # Écriture atomique: un lecteur concurrent voit l'ancien fichier ou le nouveau, jamais un fichier partiel
+            tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            try:
+                joblib.dump({'version': version, 'matrices': matrices}, tmp_path)
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        return matrices[key]
+
+def sample_outcome(probs, i, j, rng):
+    """Tire un résultat W/D/L pour teams[i] contre teams[j]"""
+    return OUTCOMES[rng.choice(3, p=probs[i, j])]
+
+# Tableau 2025 défini dans le notebook (ordre des huitièmes = ordre du tableau)
+BRACKET_16 = [
+    ('Sénégal', 'Soudan'), ('Mali', 'Tunisie'),
+    ('Maroc', 'Tanzanie'), ('Afrique du Sud', 'Cameroun'),
+    ('Égypte', 'Bénin'), ('Nigeria', 'Mozambique'),
+    ('Algérie', 'RD Congo'), ("Côte d'Ivoire", 'Burkina Faso')
+]
+ROUNDS = ['round_of_16', 'quarter_final', 'semi_final', 'final', 'champion']
+
+# Résultats réels du tournoi en cours (survivent aux redémarrages de l'API)
+TOURNAMENT_STATE_PATH = f'{MODELS_PATH}/tournament_state.json'
+LIVE_TOURNAMENT = 'African Cup of Nations'
+
+class TournamentState:
+    """Tableau à élimination directe et résultats déjà joués.
+    participants()[r]: équipes du tour r dans l'ordre du tableau (None si pas encore connue)."""
+
+    def __init__(self, bracket=BRACKET_16, results=None, path=TOURNAMENT_STATE_PATH):
+        self.bracket = [tuple(pair) for pair in bracket]
+        self.results = list(results or [])
+        self.path = path
+
+    @classmethod
+    def load(cls, path=TOURNAMENT_STATE_PATH, bracket=BRACKET_16):
+        if os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            return cls(data['bracket'], data['results'], path)
+        return cls(bracket, path=path)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'w') as f:
+            json.dump({'bracket': self.bracket, 'results': self.results}, f, ensure_ascii=False, indent=2)
+
+    @property
+    def teams(self):
+        return [t for pair in self.bracket for t in pair]
+
+    def winners(self):
+        """{(tour, match): vainqueur} des matchs joués"""
+        return {(r['round'], r['match']): r['winner'] for r in self.results}
+
+    def participants(self):
+        played = self.winners()
+        rounds = [self.teams]
+        while len(rounds[-1]) > 1:
+            r = len(rounds) - 1
+            rounds.append([played.get((r, m)) for m in range(len(rounds[-1]) // 2)])
+        return rounds
+
+    def current_round(self):
+        """Premier tour dont un match reste à jouer (len(ROUNDS) - 1 si le tournoi est terminé)"""
+        played = self.winners()
+        for r, teams in enumerate(self.participants()[:-1]):
+            if any((r, m) not in played for m in range(len(teams) // 2)):
+                return r
+        return len(ROUNDS) - 1
+
+    def find_match(self, team1, team2):
+        """(tour, match) du prochain match entre team1 et team2, ou ValueError.
+        Les noms sont comparés sous forme canonique (alias français/anglais acceptés)."""
+        played = self.winners()
+        wanted = {canonical_name(team1), canonical_name(team2)}
+        for r, teams in enumerate(self.participants()[:-1]):
+            for m in range(len(teams) // 2):
+                pair = teams[2 * m:2 * m + 2]
+                if None not in pair and {canonical_name(t) for t in pair} == wanted and (r, m) not in played:
+                    return r, m
+        raise ValueError(f"No scheduled match between {team1} and {team2} in the current bracket")
+
+    def bracket_name(self, team):
+        """Nom de l'équipe tel qu'il figure dans le tableau (alias acceptés)"""
+        return next((t for t in self.teams if canonical_name(t) == canonical_name(team)), team)
+
+    def record(self, team1, team2, team1_score, team2_score, penalty_winner=None, date=None):
+        """Enregistre un résultat réel; un nul doit être départagé aux tirs au but"""
+        r, m = self.find_match(team1, team2)
+        team1, team2 = self.bracket_name(team1), self.bracket_name(team2)
+        if penalty_winner is not None:
+            penalty_winner = self.bracket_name(penalty_winner)
+        if team1_score != team2_score:
+            winner = team1 if team1_score > team2_score else team2
+        elif penalty_winner in (team1, team2):
+            winner = penalty_winner
+        else:
+            raise ValueError("Knockout draw: penalty_winner must be one of the two teams")
+        entry = {
+            'round': r, 'match': m, 'stage': ROUNDS[r], 'team1': team1, 'team2': team2,
+            'team1_score': int(team1_score), 'team2_score': int(team2_score), 'winner': winner,
+            'date': str(pd.Timestamp(date or datetime.now()).date()),
+        }
+        self.results.append(entry)
+        return entry
+
+    def forced_winners(self):
+        """Par tour, indice (dans teams) du vainqueur réel de chaque match, -1 si non joué"""
+        teams = self.teams
+        played = self.winners()
+        forced = []
+        n_matches = len(teams) // 2
+        for r in range(len(ROUNDS) - 1):
+            forced.append(np.array([teams.index(played[r, m]) if (r, m) in played else -1 for m in range(n_matches)]))
+            n_matches //= 2
+        return forced
+
+    def store_matches(self):
+        """Résultats au format de FeatureStore.add_match (noms canoniques)"""
+        return [(get_mapped_name(r['team1']), get_mapped_name(r['team2']), pd.Timestamp(r['date']),
+                 r['team1_score'], r['team2_score'], LIVE_TOURNAMENT) for r in self.results]
+
+# Tirs au but: mélange entre pile ou face et la force relative W/(W+L) des deux équipes
+PENALTY_SKILL_WEIGHT = 0.5
+
+def penalty_win_prob(probs):
+    """Probabilité que team1 gagne la séance de tirs au but (probs[..., :] = W, D, L)"""
+    decisive = probs[..., 0] + probs[..., 2]
+    strength = np.divide(probs[..., 0], decisive, out=np.full_like(decisive, 0.5), where=decisive > 0)
+    return (1 - PENALTY_SKILL_WEIGHT) * 0.5 + PENALTY_SKILL_WEIGHT * strength
+
+def play_knockout_round(probs, team1, team2, rng):
+    """Joue un tour à élimination directe pour toutes les itérations à la fois.
+    team1/team2: tableaux d'indices (n_iter, n_matchs); retourne les vainqueurs."""
+    p = probs[team1, team2]
+    u = rng.random(team1.shape)
+    team1_wins = u < p[..., 0]
+    is_draw = ~team1_wins & (u < p[..., 0] + p[..., 1])
+    shootout = rng.random(team1.shape) < penalty_win_prob(p)
+    return np.where(team1_wins | (is_draw & shootout), team1, team2)
+
+def simulate_knockout_counts(probs, slots, n_iter, rng, forced=None, start_round=0):
+    """Compte, pour chaque équipe, le nombre d'itérations où elle atteint chaque tour.
+    `slots`: indices des équipes du tour `start_round` dans l'ordre du tableau (puissance de 2).
+    `forced[r]`: vainqueur réel de chaque match du tour r (-1 si non joué), imposé à toutes les itérations."""
+    n_teams = probs.shape[0]
+    counts = np.zeros((n_teams, len(ROUNDS)), dtype=np.int64)
+    alive = np.tile(np.asarray(slots), (n_iter, 1))
+    counts[:, start_round] = np.bincount(alive.ravel(), minlength=n_teams)
+    for r in range(start_round + 1, len(ROUNDS)):
+        alive = play_knockout_round(probs, alive[:, 0::2], alive[:, 1::2], rng)
+        if forced is not None:
+            known = forced[r - 1] >= 0
+            alive[:, known] = forced[r - 1][known]
+        counts[:, r] = np.bincount(alive.ravel(), minlength=n_teams)
+    return counts
+
+# Taille des lots Monte Carlo: chaque lot a son propre flux aléatoire (SeedSequence enfant),
+# ce qui rend les résultats identiques quel que soit le nombre de processus
+SIM_CHUNK_SIZE = 50_000
+
+def _simulate_chunk(args):
+    """Lot Monte Carlo exécuté dans un processus de travail"""
+    probs, slots, n_iter, seed_seq, forced, start_round = args
+    return simulate_knockout_counts(probs, slots, n_iter, np.random.default_rng(seed_seq), forced, start_round)
+
+def run_knockout_mc(probs, slots, n_iter, seed=None, n_workers=1, chunk_size=SIM_CHUNK_SIZE, forced=None, start_round=0):
+    """Répartit les itérations en lots (un SeedSequence enfant par lot) et additionne les comptes.
+    n_workers > 1 utilise un pool de processus; le résultat ne dépend que de `seed` et `chunk_size`."""
+    sizes = [min(chunk_size, n_iter - start) for start in range(0, n_iter, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(probs, slots, size, seed_seq, forced, start_round) for size, seed_seq in zip(sizes, seeds)]
+    if n_workers > 1 and len(tasks) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=min(n_workers, len(tasks))) as pool:
+            chunks = list(pool.map(_simulate_chunk, tasks))
+    else:
+        chunks = [_simulate_chunk(task) for task in tasks]
+    return np.sum(chunks, axis=0)
+
+def mc_standard_errors(probabilities, n_iter):
+    """Erreur standard binomiale de chaque probabilité estimée: sqrt(p(1-p)/n)"""
+    return np.sqrt(probabilities * (1 - probabilities) / n_iter)
+
+@timed('simulation.monte_carlo')
+def simulate_tournament_mc(n_iter=100_000, seed=None, bracket=BRACKET_16, n_workers=1, with_stderr=False, state=None):
+    """Monte Carlo vectorisé du tableau complet (huitièmes → finale).
+    Avec `state` (TournamentState): tableau et résultats réels du tournoi en cours, simulation
+    à partir du tour en cours seulement. Retourne, pour chaque équipe, la probabilité
+    d'atteindre chaque tour (et les erreurs standard si `with_stderr`)."""
+    if state is None:
+        state = TournamentState(bracket)
+    teams = state.teams
+    probs = get_probability_matrix(teams)
+    start_round = state.current_round()
+    slots = [teams.index(t) for t in state.participants()[start_round]]
+    counts = run_knockout_mc(probs, slots, n_iter, seed=seed, n_workers=n_workers,
+                             forced=state.forced_winners(), start_round=start_round)
+    # Tours déjà joués: certains
+    for r, participants in enumerate(state.participants()[:start_round]):
+        counts[[teams.index(t) for t in participants], r] = n_iter
+    df = pd.DataFrame(counts / n_iter, index=teams, columns=ROUNDS)
+    df = df.sort_values(['champion', 'final'], ascending=False)
+    if with_stderr:
+        return df, mc_standard_errors(df, n_iter)
+    return df
+
+def simulate_tournament(rng=None, state=None):
+    """Simule les huitièmes du tableau en cours (résultats réels conservés).
+    Sans `rng`: résultat le plus probable; avec `rng`: tirage selon les probabilités."""
+    state = state or tournament
+    bracket_16 = state.bracket
+    teams = state.teams
+    probs = get_probability_matrix(teams)
+    played = state.winners()
     
     results = {}
     quarter_finalists = []
     
     print("--- Round of 16 ---")
-    for t1, t2 in bracket_16:
-        winner, _ = predict_match(t1, t2)
-        # Forcer le vainqueur si match nul (logique simple pour les éliminatoires)
-        if winner == 'Draw': winner = t1 if FIFA_RANKING.get(t1, 100) < FIFA_RANKING.get(t2, 100) else t2
+    for m, (t1, t2) in enumerate(bracket_16):
+        i, j = teams.index(t1), teams.index(t2)
+        outcome = sample_outcome(probs, i, j, rng) if rng is not None else OUTCOMES[np.argmax(probs[i, j])]
+        winner = played.get((0, m)) or {'W': t1, 'L': t2}.get(outcome, 'Draw')
+        # Forcer le vainqueur si match nul: meilleur classement Elo
+        if winner == 'Draw': winner = t1 if team_rating(t1) >= team_rating(t2) else t2
         quarter_finalists.append(winner)
         results[f"{t1} vs {t2}"] = winner
         
     return results, quarter_finalists
 
+# Format complet (groupes + meilleurs troisièmes + tableau), scores tirés d'un modèle de Poisson
+FULL_FORMAT = tournament_format.CAN_2025_FORMAT
+FULL_STAGES = tournament_format.STAGES
+
+def _simulate_full_chunk(args):
+    """Lot Monte Carlo du format complet exécuté dans un processus de travail"""
+    comp, probs, rates, n_iter, seed_seq = args
+    return tournament_format.simulate_full_counts(comp, probs, rates, n_iter, np.random.default_rng(seed_seq), play_knockout_round)
+
+@timed('simulation.full_tournament')
+def simulate_full_tournament_mc(n_iter=100_000, seed=None, fmt=FULL_FORMAT, n_workers=1, chunk_size=SIM_CHUNK_SIZE, with_stderr=False):
+    """Monte Carlo vectorisé du tournoi de bout en bout: phase de groupes (scores simulés,
+    critères de départage), meilleurs troisièmes, puis tableau final.
+    Retourne, pour chaque équipe, la probabilité d'atteindre chaque étape."""
+    comp = tournament_format.compile_format(fmt)
+    teams = comp['teams']
+    probs = get_probability_matrix(teams)
+    with timer('simulation.goal_rates'):
+        rates = tournament_format.goal_rates_matrix(probs)
+    sizes = [min(chunk_size, n_iter - start) for start in range(0, n_iter, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(comp, probs, rates, size, seed_seq) for size, seed_seq in zip(sizes, seeds)]
+    if n_workers > 1 and len(tasks) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=min(n_workers, len(tasks))) as pool:
+            chunks = list(pool.map(_simulate_full_chunk, tasks))
+    else:
+        chunks = [_simulate_full_chunk(task) for task in tasks]
+    df = pd.DataFrame(np.sum(chunks, axis=0) / n_iter, index=teams, columns=FULL_STAGES)
+    df = df.sort_values(['champion', 'final'], ascending=False)
+    if with_stderr:
+        return df, mc_standard_errors(df, n_iter)
+    return df
+
+# Tournoi en cours: résultats persistés, rejoués sur le feature store à chaque chargement du modèle
+tournament = TournamentState.load()
+registry.live_matches = tournament.store_matches()
+
+# Un seul résultat (ou une remise à zéro) à la fois: tableau, feature store et fichier d'état
+# sont modifiés ensemble
+tournament_lock = threading.RLock()
+
+def record_result(team1, team2, team1_score, team2_score, penalty_winner=None, date=None):
+    """Enregistre un résultat réel: tableau, état des équipes (forme, Elo, face-à-face) et caches.
+    ValueError si le match n'est pas au programme ou si sa date précède le dernier match connu."""
+    with tournament_lock:
+        entry = tournament.record(team1, team2, team1_score, team2_score, penalty_winner, date)
+        try:
+            registry.add_live_match(*tournament.store_matches()[-1])
+        except Exception:
+            tournament.results.pop()
+            raise
+        tournament.save()
+        return entry
+
+def validate_bracket(bracket):
+    """Vérifie un tableau des huitièmes avant de l'adopter; ValueError sinon.
+    8 paires (un tour par entrée de ROUNDS), équipes connues, chacune une seule fois."""
+    bracket = [tuple(pair) for pair in bracket]
+    n_pairs = 2 ** (len(ROUNDS) - 2)
+    if len(bracket) != n_pairs or any(len(pair) != 2 for pair in bracket):
+        raise ValueError(f"Bracket must have {n_pairs} pairs of two teams, got {len(bracket)}")
+    teams = registry.get().feature_store.registry
+    seen = set()
+    for team1, team2 in bracket:
+        pair = (teams.resolve(team1), teams.resolve(team2))
+        if pair[0] == pair[1]:
+            raise ValueError(f"A team cannot play itself: {team1!r} vs {team2!r}")
+        for team, name in zip(pair, (team1, team2)):
+            if team in seen:
+                raise ValueError(f"Team appears twice in the bracket: {name!r}")
+            seen.add(team)
+    return bracket
+
+def reset_tournament(bracket=None):
+    """Efface les résultats (et change de tableau si `bracket` est fourni); l'état des équipes
+    revient aux artefacts sur disque. Un tableau invalide est refusé sans toucher à l'état."""
+    global tournament
+    with tournament_lock:
+        bracket = validate_bracket(bracket) if bracket is not None else tournament.bracket
+        tournament = TournamentState(bracket, path=tournament.path)
+        tournament.save()
+        registry.live_matches = []
+        if registry.ready:
+            registry.reload()
+        return tournament
+
+@timed('simulation.live')
+def simulate_live(n_iter=100_000, seed=None, n_workers=1):
+    """Probabilités par tour à partir de l'état réel du tournoi"""
+    return simulate_tournament_mc(n_iter=n_iter, seed=seed, n_workers=n_workers, state=tournament)
+
 if __name__ == "__main__":
-    # Test
-    print("Test Prediction: Égypte vs Algérie")
-    winner, probs = predict_match("Égypte", "Algérie")
-    print(f"Winner: {winner}, Probs: {probs}")
\ No newline at end of file
+    with profiling('4_simulation_lib'):
+        # Test
+        print("Test Prediction: Égypte vs Algérie")
+        winner, probs = predict_match("Égypte", "Algérie")
+        print(f"Winner: {winner}, Probs: {probs}")
+    
+        print("\nMonte Carlo (100000 tournois)")
+        mc, stderr = simulate_tournament_mc(n_iter=100_000, seed=42, n_workers=os.cpu_count() or 1, with_stderr=True)
+        print(mc.round(4))
+        print(f"Max standard error: {stderr.values.max():.4f}")
+
+        print("\nFull tournament (groups + knockout, 100000 iterations)")
+        full = simulate_full_tournament_mc(n_iter=100_000, seed=42, n_workers=os.cpu_count() or 1)
+        print(full.round(4))
+    report("Simulation timings")
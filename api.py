@@ -1,10 +1,19 @@
+import asyncio
+import hashlib
 import importlib
 import sys
-from fastapi import FastAPI, HTTPException
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 import os
+from typing import List, Optional, Tuple
+import instrumentation
 
 # Ensure the current directory is in sys.path
 sys.path.append(os.getcwd())
@@ -14,6 +23,56 @@ try:
 except ImportError:
     raise ImportError("Could not import '4_simulation_lib.py'. Make sure you are in the project root.")
 
+# Cache des prédictions et pool d'inférence (configurables par variables d'environnement)
+CACHE_SIZE = int(os.environ.get('CAN_API_CACHE_SIZE', '1024'))
+CACHE_TTL = float(os.environ.get('CAN_API_CACHE_TTL', '300'))  # secondes
+HTTP_CACHE = os.environ.get('CAN_API_HTTP_CACHE', '1') == '1'  # en-têtes ETag / Cache-Control
+INFERENCE_WORKERS = int(os.environ.get('CAN_API_WORKERS', '4'))
+# Paires par requête batch (toutes les paires ordonnées de 24 équipes: 552)
+MAX_BATCH = int(os.environ.get('CAN_API_MAX_BATCH', '600'))
+
+class PredictionCache:
+    """LRU avec expiration: clé (team1, team2, version du modèle) -> prédiction formatée"""
+
+    def __init__(self, maxsize=CACHE_SIZE, ttl=CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {'size': len(self._entries), 'maxsize': self.maxsize, 'ttl': self.ttl,
+                'hits': self.hits, 'misses': self.misses}
+
+prediction_cache = PredictionCache()
+# Pool borné: l'inférence (pandas + forêt) ne bloque pas la boucle d'événements
+inference_pool = ThreadPoolExecutor(max_workers=INFERENCE_WORKERS, thread_name_prefix='inference')
+
 app = FastAPI()
 
 # Enable CORS
@@ -24,39 +83,235 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    """Latence de bout en bout de chaque route (histogramme api.<méthode> <route>)"""
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Gabarit de la route plutôt que l'URL brute: nombre de séries borné
+    route = request.scope.get('route')
+    path = route.path if route is not None else 'unmatched'
+    instrumentation.observe(f'api.{request.method} {path}', time.perf_counter() - start)
+    return response
+
 class MatchRequest(BaseModel):
     team1: str # Expecting French name e.g., "Algérie"
     team2: str
+    date: Optional[str] = None # Date du match (repos, fatigue), par défaut aujourd'hui
+
+class BatchMatchRequest(BaseModel):
+    matches: List[MatchRequest]
+
+class ResultRequest(BaseModel):
+    team1: str
+    team2: str
+    team1_score: int
+    team2_score: int
+    penalty_winner: Optional[str] = None # Obligatoire si match nul
+    date: Optional[str] = None
+
+class ResetRequest(BaseModel):
+    bracket: Optional[List[Tuple[str, str]]] = None
+
+# Itérations Monte Carlo pour les probabilités du tournoi en direct
+LIVE_SIM_ITERATIONS = int(os.environ.get('CAN_API_LIVE_ITERATIONS', '100000'))
+
+def format_prediction(winner, probs):
+    """Map probs to frontend fields"""
+    t1_prob = float(probs.get('W', 0.0)) * 100
+    draw_prob = float(probs.get('D', 0.0)) * 100
+    t2_prob = float(probs.get('L', 0.0)) * 100 # Loss for T1 is Win for T2
+    
+    confidence = max(t1_prob, t2_prob, draw_prob)
+    
+    return {
+        "winner": winner if winner != 'Draw' else 'draw',
+        "team1WinProb": round(t1_prob, 1),
+        "drawProb": round(draw_prob, 1),
+        "team2WinProb": round(t2_prob, 1),
+        "confidence": round(confidence, 1)
+    }
+
+def cached_lookup(pairs, version):
+    """Prédictions déjà en cache pour cette version du modèle (None si absentes).
+    `pairs`: (team1, team2, date du match)."""
+    return [prediction_cache.get((t1, t2, date, version)) for t1, t2, date in pairs]
+
+def predict_by_date(pairs, artifacts):
+    """Prédictions formatées de paires (team1, team2, date): un batch par date de match"""
+    computed = {}
+    for date in dict.fromkeys(date for _, _, date in pairs):
+        same_day = [(t1, t2) for t1, t2, d in pairs if d == date]
+        for (t1, t2), (winner, probs) in zip(same_day, sim_lib.predict_matches(same_day, artifacts, date)):
+            computed[t1, t2, date] = format_prediction(winner, probs)
+    return computed
+
+def compute_predictions(pairs, results=None, version=None):
+    """Calcule les paires absentes du cache (un batch par date) et les y ajoute.
+    Exécuté dans le pool d'inférence."""
+    # Un seul instantané: la version des entrées en cache est celle des artefacts qui les calculent
+    artifacts = sim_lib.registry.get()
+    if results is None or version != artifacts.version:
+        version = artifacts.version
+        results = cached_lookup(pairs, version)
+    missing = list(dict.fromkeys(pair for pair, result in zip(pairs, results) if result is None))
+    if missing:
+        computed = predict_by_date(missing, artifacts)
+        # Un résultat en direct ajouté pendant le calcul: ne pas étiqueter ces prédictions avec l'ancienne version
+        if artifacts.version == version:
+            for (t1, t2, date), prediction in computed.items():
+                prediction_cache.put((t1, t2, date, version), prediction)
+        results = [result if result is not None else computed[pair] for pair, result in zip(pairs, results)]
+    return results, version
+
+def match_key(match):
+    """(team1, team2, date du match) d'une requête, noms canoniques: "Maroc", "maroc" et "Morocco"
+    partagent la même entrée de cache et le même ETag. La date par défaut est celle du jour."""
+    return (sim_lib.get_mapped_name(match.team1), sim_lib.get_mapped_name(match.team2),
+            str(sim_lib.fixture_date(match.date).date()))
+
+def with_request_names(prediction, match):
+    """Vainqueur sous le nom utilisé dans la requête (le cache est en noms canoniques)"""
+    names = {sim_lib.get_mapped_name(match.team1): match.team1, sim_lib.get_mapped_name(match.team2): match.team2}
+    return {**prediction, 'winner': names.get(prediction['winner'], prediction['winner'])}
+
+async def get_predictions(pairs):
+    """Cache d'abord (sans quitter la boucle), inférence des manquants dans le pool"""
+    results = version = None
+    if sim_lib.registry.ready:
+        version = sim_lib.registry.get().version
+        results = cached_lookup(pairs, version)
+        if all(result is not None for result in results):
+            return results, version
+    loop = asyncio.get_running_loop()
+    with instrumentation.timer('api.inference'):
+        return await loop.run_in_executor(inference_pool, compute_predictions, pairs, results, version)
+
+def prediction_etag(version, pairs):
+    digest = hashlib.sha1(repr((version, pairs)).encode()).hexdigest()[:20]
+    return f'"{digest}"'
+
+def cached_response(request, response, version, pairs):
+    """En-têtes ETag / Cache-Control; True si le client a déjà cette version (304, GET seulement)"""
+    if not HTTP_CACHE:
+        return False
+    etag = prediction_etag(version, pairs)
+    response.headers['ETag'] = etag
+    # private: les probabilités changent avec les résultats en direct, pas de cache partagé
+    response.headers['Cache-Control'] = f'private, max-age={int(CACHE_TTL)}'
+    return request.method == 'GET' and request.headers.get('if-none-match') == etag
+
+@app.get("/predict")
+async def predict_match_get_endpoint(team1: str, team2: str, request: Request, response: Response,
+                                     date: Optional[str] = None):
+    """Variante GET (cacheable, requêtes conditionnelles If-None-Match)"""
+    return await predict_match_endpoint(MatchRequest(team1=team1, team2=team2, date=date), request, response)
 
 @app.post("/predict")
-def predict_match_endpoint(req: MatchRequest):
+async def predict_match_endpoint(req: MatchRequest, request: Request, response: Response):
     try:
-        winner, probs = sim_lib.predict_match(req.team1, req.team2)
-        
-        # Map probs to frontend fields
-        t1_prob = float(probs.get('W', 0.0)) * 100
-        draw_prob = float(probs.get('D', 0.0)) * 100
-        t2_prob = float(probs.get('L', 0.0)) * 100 # Loss for T1 is Win for T2
-        
-        response_winner = 'draw'
-        if winner == req.team1:
-            response_winner = req.team1 # Pass back the name, frontend might map to ID if seeded correctly or we handle IDs
-        elif winner == req.team2:
-            response_winner = req.team2
-            
-        confidence = max(t1_prob, t2_prob, draw_prob)
-        
-        return {
-            "winner": winner if winner != 'Draw' else 'draw',
-            "team1WinProb": round(t1_prob, 1),
-            "drawProb": round(draw_prob, 1),
-            "team2WinProb": round(t2_prob, 1),
-            "confidence": round(confidence, 1)
-        }
-        
+        pairs = [match_key(req)]
+        results, version = await get_predictions(pairs)
+    except ValueError as e:
+        # Équipe inconnue du registre: signalée au client plutôt que prédite avec des valeurs par défaut
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"Error predicting match: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    if cached_response(request, response, version, pairs):
+        return Response(status_code=304, headers=dict(response.headers))
+    return with_request_names(results[0], req)
+
+@app.post("/predict/batch")
+async def predict_batch_endpoint(req: BatchMatchRequest, request: Request, response: Response):
+    if len(req.matches) > MAX_BATCH:
+        raise HTTPException(status_code=400, detail=f"Too many matches in one batch ({len(req.matches)} > {MAX_BATCH})")
+    try:
+        pairs = [match_key(m) for m in req.matches]
+        results, version = await get_predictions(pairs)
+    except ValueError as e:
+        # Équipe inconnue du registre: signalée au client plutôt que prédite avec des valeurs par défaut
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"Error predicting batch: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    if cached_response(request, response, version, pairs):
+        return Response(status_code=304, headers=dict(response.headers))
+    return {
+        "predictions": [
+            {"team1": m.team1, "team2": m.team2, **with_request_names(prediction, m)}
+            for m, prediction in zip(req.matches, results)
+        ]
+    }
+
+def tournament_snapshot():
+    """Tableau, résultats et probabilités par tour à partir de l'état réel du tournoi"""
+    start = time.perf_counter()
+    df = sim_lib.simulate_live(n_iter=LIVE_SIM_ITERATIONS, seed=0)
+    return {
+        "current_round": sim_lib.ROUNDS[sim_lib.tournament.current_round()],
+        "results": sim_lib.tournament.results,
+        "probabilities": {team: {k: round(float(v), 4) for k, v in row.items()} for team, row in df.iterrows()},
+        "version": sim_lib.registry.version,
+        "simulation_seconds": round(time.perf_counter() - start, 3),
+    }
+
+def record_and_simulate(req):
+    entry = sim_lib.record_result(req.team1, req.team2, req.team1_score, req.team2_score,
+                                  req.penalty_winner, req.date)
+    # Nouvelle version du modèle en direct: les prédictions en cache sont périmées
+    prediction_cache.clear()
+    return {"recorded": entry, **tournament_snapshot()}
+
+@app.get("/tournament")
+async def tournament_endpoint():
+    return await asyncio.get_running_loop().run_in_executor(inference_pool, tournament_snapshot)
+
+@app.post("/tournament/results")
+async def tournament_result_endpoint(req: ResultRequest):
+    try:
+        return await asyncio.get_running_loop().run_in_executor(inference_pool, record_and_simulate, req)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/tournament/reset")
+async def tournament_reset_endpoint(req: ResetRequest):
+    def reset():
+        sim_lib.reset_tournament(req.bracket)
+        prediction_cache.clear()
+        return tournament_snapshot()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(inference_pool, reset)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/health")
+def health_endpoint():
+    return {**sim_lib.registry.status(), 'cache': prediction_cache.stats()}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint(format: str = 'prometheus'):
+    """Histogrammes de latence par étape (Prometheus, ou JSON avec ?format=json)"""
+    if format == 'json':
+        return JSONResponse(instrumentation.snapshot())
+    return instrumentation.prometheus_text()
+
+@app.post("/model/warmup")
+async def warmup_endpoint():
+    try:
+        return await asyncio.get_running_loop().run_in_executor(inference_pool, sim_lib.registry.warm_up)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+@app.post("/model/reload")
+async def reload_endpoint():
+    try:
+        status = await asyncio.get_running_loop().run_in_executor(inference_pool, sim_lib.registry.reload)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    # Nouvelle version: les entrées de l'ancienne ne seront plus jamais lues
+    prediction_cache.clear()
+    return status
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,167 @@
+"""Test de charge de l'API de prédiction: débit, latences p50/p95/p99, mémoire et répartition
+du temps d'inférence (fonctionnalités / normalisation / predict_proba).
+
+Par défaut l'application FastAPI est démarrée dans le processus (httpx + ASGI); avec --url
+les requêtes visent un serveur uvicorn local (--pid pour mesurer la mémoire de ses workers).
+Les résultats sont écrits en JSON pour comparer les commits entre eux.
+
+    python benchmarks/bench_api.py --requests 2000 --concurrency 16 --output bench_api.json
+    python benchmarks/bench_api.py --url http://127.0.0.1:8000 --pid 12345
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime
+import httpx
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+import api
+
+sim_lib = api.sim_lib
+TEAMS = list(sim_lib.FIFA_RANKING)
+# Part du trafic sur les affiches du jour (tableau des huitièmes), le reste sur toutes les paires
+HOT_SHARE = 0.7
+
+def request_mix(n_requests, seed=0):
+    """Séquence de paires réaliste: quelques affiches concentrent l'essentiel du trafic"""
+    rng = np.random.default_rng(seed)
+    hot = [pair for t1, t2 in sim_lib.BRACKET_16 for pair in ((t1, t2), (t2, t1))]
+    all_pairs = [(t1, t2) for t1 in TEAMS for t2 in TEAMS if t1 != t2]
+    is_hot = rng.random(n_requests) < HOT_SHARE
+    hot_idx = rng.integers(0, len(hot), n_requests)
+    all_idx = rng.integers(0, len(all_pairs), n_requests)
+    return [hot[h] if flag else all_pairs[a] for flag, h, a in zip(is_hot, hot_idx, all_idx)]
+
+def process_memory(pid='self'):
+    """RSS courant et pic (Mo) d'un processus, lus dans /proc (Linux)"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            fields = dict(line.split(':', 1) for line in f)
+        return {'rss_mb': int(fields['VmRSS'].split()[0]) / 1024,
+                'peak_rss_mb': int(fields['VmHWM'].split()[0]) / 1024}
+    except (OSError, KeyError):
+        if pid != 'self':
+            return None
+        return {'rss_mb': None, 'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+
+def percentiles(values_ms):
+    values = np.asarray(values_ms)
+    return {
+        'mean': float(values.mean()), 'p50': float(np.percentile(values, 50)),
+        'p95': float(np.percentile(values, 95)), 'p99': float(np.percentile(values, 99)),
+        'max': float(values.max()),
+    }
+
+async def run_load(client, pairs, concurrency):
+    """Rejoue les requêtes avec `concurrency` clients simultanés; retourne latences et statuts"""
+    latencies = [0.0] * len(pairs)
+    statuses = {}
+    queue = asyncio.Queue()
+    for item in enumerate(pairs):
+        queue.put_nowait(item)
+
+    async def worker():
+        while not queue.empty():
+            i, (t1, t2) = queue.get_nowait()
+            start = time.perf_counter()
+            response = await client.post('/predict', json={'team1': t1, 'team2': t2})
+            latencies[i] = (time.perf_counter() - start) * 1000
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, statuses, time.perf_counter() - start
+
+def inference_breakdown(pairs, repeat=200):
+    """Temps (ms) de chaque étape d'une prédiction, hors HTTP et hors cache"""
+    artifacts = sim_lib.registry.get()
+    timings = {'features': [], 'scaling': [], 'predict_proba': [], 'flat_forest': []}
+    for t1, t2 in pairs[:repeat]:
+        start = time.perf_counter()
+        X = sim_lib.get_live_features_batch([(t1, t2)])
+        t_features = time.perf_counter()
+        X_scaled = artifacts.scaler.transform(X)
+        t_scaling = time.perf_counter()
+        artifacts.model.predict_proba(X_scaled)
+        t_predict = time.perf_counter()
+        if artifacts.forest is not None:
+            artifacts.forest.predict_proba(X.to_numpy(dtype=float))
+            timings['flat_forest'].append((time.perf_counter() - t_predict) * 1000)
+        timings['features'].append((t_features - start) * 1000)
+        timings['scaling'].append((t_scaling - t_features) * 1000)
+        timings['predict_proba'].append((t_predict - t_scaling) * 1000)
+    return {stage: percentiles(values) for stage, values in timings.items() if values}
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def benchmark(args):
+    pairs = request_mix(args.requests, args.seed)
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=60)
+    else:
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=api.app), base_url='http://bench', timeout=60)
+        sim_lib.registry.get()
+        if args.no_cache:
+            api.prediction_cache.maxsize = 0
+    async with client:
+        # Échauffement: chargement du modèle et premières allocations exclus des mesures
+        await client.post('/predict', json={'team1': TEAMS[0], 'team2': TEAMS[1]})
+        if not args.url:
+            api.prediction_cache.clear()
+        latencies, statuses, elapsed = await run_load(client, pairs, args.concurrency)
+
+    results = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'config': {'requests': args.requests, 'concurrency': args.concurrency, 'url': args.url,
+                   'cache': not args.no_cache, 'hot_share': HOT_SHARE, 'seed': args.seed,
+                   'inference_workers': api.INFERENCE_WORKERS},
+        'throughput_rps': len(pairs) / elapsed,
+        'elapsed_s': elapsed,
+        'status_codes': {str(code): count for code, count in sorted(statuses.items())},
+        'latency_ms': percentiles(latencies),
+    }
+    if args.url:
+        results['memory_mb'] = {str(pid): process_memory(pid) for pid in args.pid}
+    else:
+        results['memory_mb'] = {'in_process': process_memory()}
+        results['cache'] = api.prediction_cache.stats()
+        results['breakdown_ms'] = inference_breakdown(pairs)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--url', help="benchmark a running server instead of the in-process app")
+    parser.add_argument('--pid', type=int, nargs='*', default=[], help="server worker PIDs to report memory for (with --url)")
+    parser.add_argument('--no-cache', action='store_true', help="disable the prediction cache (in-process only)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmarks/bench_api.json')
+    args = parser.parse_args()
+
+    results = asyncio.run(benchmark(args))
+    latency = results['latency_ms']
+    print(f"Requests: {args.requests} (concurrency {args.concurrency})")
+    print(f"Throughput: {results['throughput_rps']:.0f} req/s")
+    print(f"Latency (ms): p50 {latency['p50']:.2f}  p95 {latency['p95']:.2f}  p99 {latency['p99']:.2f}")
+    for stage, stats in results.get('breakdown_ms', {}).items():
+        print(f"  {stage:<14} {stats['mean']:8.3f} ms")
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"✅ Results saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Micro-benchmark du nettoyage: anciennes fonctions ligne par ligne vs couche vectorisée
+de 1_data_cleaning.py, sur un fichier de matchs synthétique.
+
+    python benchmarks/bench_cleaning.py --rows 1000000
+"""
+import argparse
+import importlib
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+cleaning = importlib.import_module('1_data_cleaning')
+
+TEAMS = ['Morocco', 'Senegal', 'Egypt', 'Ivory Coast', 'Nigeria', 'Tunisia', 'Algeria', 'Cameroon',
+         'Mali', 'South Africa', 'DR Congo', 'Burkina Faso', 'Benin', 'Tanzania', 'Mozambique', 'Sudan']
+
+def synthetic_matches(n_rows, seed=0):
+    """Fichier de matchs synthétique: noms bruités, scores, dates texte et GD au format Wikipedia"""
+    rng = np.random.default_rng(seed)
+    variants = [f(t) for t in TEAMS for f in (str.upper, str.lower, lambda x: f'  {x} ')]
+    dates = pd.Timestamp('1957-01-01') + pd.to_timedelta(rng.integers(0, 25_000, n_rows), unit='D')
+    can_dates = pd.Series(dates.strftime('%d-%b-%y'))
+    can_dates[rng.random(n_rows) < 0.01] = 'TBD'
+    gd = pd.Series(rng.integers(-40, 80, n_rows)).map(lambda x: f'+{x}' if x > 0 else (f'−{-x}' if x < 0 else '0'))
+    return pd.DataFrame({
+        'home_team': rng.choice(variants, n_rows), 'away_team': rng.choice(variants, n_rows),
+        'home_score': rng.integers(0, 6, n_rows), 'away_score': rng.integers(0, 6, n_rows),
+        'Date': can_dates, 'GD': gd,
+    })
+
+# Anciennes implémentations (avant vectorisation)
+def legacy_result(df):
+    def get_result(row):
+        if row['home_score'] > row['away_score']: return 'W'
+        elif row['home_score'] < row['away_score']: return 'L'
+        else: return 'D'
+    return df.apply(get_result, axis=1)
+
+def legacy_normalize(df):
+    # Copie figée de l'ancien normalize_team_name (le nom courant passe par le registre des équipes)
+    def normalize_team_name(name):
+        if pd.isna(name):
+            return name
+        return name.strip().title()
+    return df['home_team'].apply(normalize_team_name)
+
+def legacy_dates(df):
+    def parse_can_date(date_str):
+        if pd.isna(date_str): return None
+        try: return pd.to_datetime(date_str, format='%d-%b-%y')
+        except: return None
+    return df['Date'].apply(parse_can_date)
+
+def legacy_gd(df):
+    def convert_gd(gd_str):
+        if pd.isna(gd_str): return 0
+        gd_str = str(gd_str).replace('+', '').replace('−', '-').replace('–', '-')
+        try: return int(gd_str)
+        except: return 0
+    return df['GD'].apply(convert_gd)
+
+BENCHMARKS = [
+    ('result', legacy_result, lambda df: cleaning.match_result(df['home_score'], df['away_score'])),
+    ('normalize_team_name', legacy_normalize, lambda df: cleaning.normalize_team_names(df['home_team'])),
+    ('parse_can_date', legacy_dates, lambda df: pd.to_datetime(df['Date'], format='%d-%b-%y', errors='coerce')),
+    ('convert_gd', legacy_gd, lambda df: cleaning.convert_goal_difference(df['GD'])),
+]
+
+def same_values(a, b):
+    return pd.Series(np.asarray(a)).astype(str).equals(pd.Series(np.asarray(b)).astype(str))
+
+def timed(func, df):
+    start = time.perf_counter()
+    out = func(df)
+    return time.perf_counter() - start, out
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    args = parser.parse_args()
+    
+    df = synthetic_matches(args.rows)
+    print(f"Synthetic match file: {len(df):,} rows")
+    print(f"{'function':<22}{'before (s)':>12}{'after (s)':>12}{'speedup':>10}")
+    for name, before, after in BENCHMARKS:
+        t_before, out_before = timed(before, df)
+        t_after, out_after = timed(after, df)
+        # Les deux versions doivent produire les mêmes valeurs
+        assert same_values(out_before, out_after), f"{name}: vectorized output differs"
+        print(f"{name:<22}{t_before:>12.3f}{t_after:>12.3f}{t_before / t_after:>9.0f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Classement Elo des équipes, calculé en flux sur l'historique des matchs (ordre chronologique).
+
+Barème inspiré de eloratings.net: K selon la compétition, multiplicateur selon l'écart de buts,
+avantage du terrain pour l'équipe qui reçoit. En phase finale de CAN ou de Coupe du monde
+(tournois dont les pays hôtes sont connus), le terrain est neutre sauf pour le pays hôte.
+"""
+import numpy as np
+import pandas as pd
+from team_registry import TeamRegistry
+
+INITIAL_RATING = 1500.0
+HOME_ADVANTAGE = 100.0
+# Poids K par type de compétition (le premier motif trouvé dans le nom du tournoi l'emporte)
+K_FACTORS = [
+    ('qualification', 40),
+    ('FIFA World Cup', 60),
+    ('African Cup of Nations', 50),
+    ('Friendly', 20),
+]
+DEFAULT_K = 30
+
+# Pays hôtes des phases finales, par année du match
+CAN_HOSTS = {2010:['Angola'], 2012:['Equatorial Guinea','Gabon'], 2013:['South Africa'],
+             2015:['Equatorial Guinea'], 2017:['Gabon'], 2019:['Egypt'],
+             2022:['Cameroon'], 2024:['Ivory Coast'], 2025:['Morocco'], 2026:['Morocco']}
+WORLD_CUP_HOSTS = {2010:['South Africa'], 2014:['Brazil'], 2018:['Russia'], 2022:['Qatar']}
+FINAL_TOURNAMENT_HOSTS = {'African Cup of Nations': CAN_HOSTS, 'FIFA World Cup': WORLD_CUP_HOSTS}
+
+def k_factor(tournament):
+    if tournament is None or pd.isna(tournament):
+        return DEFAULT_K
+    for pattern, k in K_FACTORS:
+        if pattern.lower() in str(tournament).lower():
+            return k
+    return DEFAULT_K
+
+def is_neutral(tournament):
+    """Phase finale d'un tournoi dont les pays hôtes sont connus: terrain neutre sauf pour l'hôte.
+    Les autres tournois (COSAFA, CECAFA, CHAN, Coupe arabe...) gardent l'avantage de l'équipe qui reçoit."""
+    if tournament is None or pd.isna(tournament):
+        return False
+    return str(tournament) in FINAL_TOURNAMENT_HOSTS
+
+def tournament_hosts(tournament, year):
+    """Pays hôtes d'une phase finale (vide si inconnus)"""
+    if tournament is None or pd.isna(tournament) or year is None:
+        return []
+    return FINAL_TOURNAMENT_HOSTS.get(str(tournament), {}).get(int(year), [])
+
+def home_advantage(team1, team2, tournament, year, advantage=HOME_ADVANTAGE):
+    """Avantage de team1 en points Elo: celui qui reçoit hors phase finale, le pays hôte en phase finale"""
+    if not is_neutral(tournament):
+        return advantage
+    hosts = tournament_hosts(tournament, year)
+    return advantage * (int(team1 in hosts) - int(team2 in hosts))
+
+def goal_multiplier(goal_diff):
+    goal_diff = abs(goal_diff)
+    if goal_diff <= 1:
+        return 1.0
+    if goal_diff == 2:
+        return 1.5
+    return (11 + goal_diff) / 8
+
+def expected_score(rating1, rating2):
+    """Score attendu de l'équipe 1 (victoire = 1, nul = 0.5)"""
+    return 1 / (1 + 10 ** ((rating2 - rating1) / 400))
+
+class EloRatings:
+    """Classement courant de chaque équipe, indexé par identifiant du registre des équipes;
+    chaque match le met à jour en O(1)"""
+
+    def __init__(self, registry=None, initial=INITIAL_RATING, home_advantage=HOME_ADVANTAGE):
+        self.registry = registry if registry is not None else TeamRegistry()
+        self.initial = initial
+        self.home_advantage = home_advantage
+        self.ratings = {}
+
+    def rating(self, team):
+        """Classement de l'équipe d'identifiant `team`"""
+        return self.ratings.get(team, self.initial)
+
+    def update(self, team1, team2, home_score, away_score, tournament=None, date=None):
+        """Applique un match (team1 reçoit, identifiants) et retourne les classements (avant, après)
+        des deux équipes. `date` sert à trouver le pays hôte d'une phase finale."""
+        before1, before2 = self.rating(team1), self.rating(team2)
+        year = pd.Timestamp(date).year if date is not None else None
+        names = self.registry.names
+        home = home_advantage(names[team1], names[team2], tournament, year, self.home_advantage)
+        score = 1.0 if home_score > away_score else (0.5 if home_score == away_score else 0.0)
+        delta = k_factor(tournament) * goal_multiplier(home_score - away_score) * (score - expected_score(before1 + home, before2))
+        self.ratings[team1] = before1 + delta
+        self.ratings[team2] = before2 - delta
+        return (before1, before2), (before1 + delta, before2 - delta)
+
+    def process(self, df):
+        """Passe unique sur des matchs triés par date (team1, team2, home_score, away_score, tournament, date).
+        Retourne, aligné sur df, les classements avant et après chaque match."""
+        tournaments = df['tournament'] if 'tournament' in df.columns else [None] * len(df)
+        dates = pd.to_datetime(df['date']) if 'date' in df.columns else [None] * len(df)
+        out = np.empty((len(df), 4))
+        rows = zip(self.registry.encode(df['team1'], add=True), self.registry.encode(df['team2'], add=True),
+                   df['home_score'].to_numpy(), df['away_score'].to_numpy(), tournaments, dates)
+        for i, (team1, team2, home_score, away_score, tournament, date) in enumerate(rows):
+            before, after = self.update(int(team1), int(team2), int(home_score), int(away_score), tournament, date)
+            out[i] = before + after
+        return pd.DataFrame(out, index=df.index, columns=['team1_elo', 'team2_elo', 'team1_elo_after', 'team2_elo_after'])
+
+    def top(self, n=10):
+        """(nom, classement) des n meilleures équipes"""
+        best = sorted(self.ratings.items(), key=lambda item: -item[1])[:n]
+        return [(self.registry.names[team], rating) for team, rating in best]
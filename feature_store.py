@@ -0,0 +1,414 @@
+import os
+import joblib
+import numpy as np
+import pandas as pd
+from h2h_index import H2HIndex, cumulative_h2h, DEFAULT_H2H_WIN_RATE
+from elo import EloRatings, INITIAL_RATING, CAN_HOSTS
+from team_registry import TeamRegistry
+from instrumentation import timed
+
+FEATURE_STORE_PATH = 'models/feature_store.joblib'
+
+FORM_WINDOW = 5
+POINTS_FOR = {'W': 3, 'D': 1, 'L': 0}
+POINTS_AGAINST = {'W': 0, 'D': 1, 'L': 3}
+DEFAULT_FORM_POINTS = 7.5
+DEFAULT_FIFA_RANK = 100
+DEFAULT_CAN_WIN_RATE = 0.35
+DEFAULT_CAN_TITLES = 0
+# Repos: jours depuis le dernier match (plafonné, valeur du plafond sans historique)
+REST_DAYS_CAP = 365
+# Fatigue: nombre de matchs joués dans les N jours précédents
+FATIGUE_WINDOW_DAYS = 30
+
+# Colonnes d'entrée du modèle, dans l'ordre du jeu de données final
+FEATURE_COLUMNS = [
+    'fifa_rank_diff', 'team1_elo', 'team2_elo', 'elo_diff',
+    'team1_last5_points', 'team2_last5_points', 'team1_last5_goal_diff', 'team2_last5_goal_diff',
+    'team1_can_win_rate', 'team2_can_win_rate', 'h2h_total_matches', 'h2h_team1_win_rate',
+    'team1_is_host', 'team2_is_host', 'stage_group',
+    'days_since_last_match_team1', 'days_since_last_match_team2',
+    'team1_matches_last30', 'team2_matches_last30',
+    'team1_can_titles', 'team2_can_titles',
+    'form_momentum_diff', 'can_performance_diff', 'h2h_dominance', 'titles_advantage'
+]
+
+def to_long_format(df):
+    """Format long: une ligne par équipe et par match, du point de vue de l'équipe"""
+    # Upcast: les scores peuvent être stockés en petits entiers (int8), trop étroits pour les cumuls
+    goal_diff = df['home_score'].astype('int64') - df['away_score'].astype('int64')
+    result = df['result'].astype(str)
+    home = pd.DataFrame({
+        'match_idx': df.index, 'side': 'team1', 'team': df['team1'], 'date': df['date'],
+        'points': result.map(POINTS_FOR).fillna(0), 'goal_diff': goal_diff
+    })
+    away = pd.DataFrame({
+        'match_idx': df.index, 'side': 'team2', 'team': df['team2'], 'date': df['date'],
+        'points': result.map(POINTS_AGAINST).fillna(0), 'goal_diff': -goal_diff
+    })
+    # Tri stable sur l'index: conserve l'ordre chronologique de df
+    return pd.concat([home, away], ignore_index=True).sort_values('match_idx', kind='stable')
+
+def composite_features(f):
+    """Fonctionnalités composites, identiques à l'entraînement (colonnes) et au service (scalaires)"""
+    return {
+        'fifa_rank_diff': f['team1_fifa_rank'] - f['team2_fifa_rank'],
+        'elo_diff': f['team1_elo'] - f['team2_elo'],
+        'form_momentum_diff': f['team1_last5_goal_diff'] - f['team2_last5_goal_diff'],
+        'can_performance_diff': f['team1_can_win_rate'] - f['team2_can_win_rate'],
+        'h2h_dominance': f['h2h_team1_win_rate'] - 0.5,
+        'titles_advantage': f['team1_can_titles'] - f['team2_can_titles'],
+    }
+
+def _as_datetime64(date):
+    return np.datetime64(pd.Timestamp(date).to_datetime64(), 'ns')
+
+def _take(table, codes, default):
+    """Valeurs par identifiant d'équipe (défaut si inconnue ou sans valeur)"""
+    codes = np.asarray(codes)
+    known = (codes >= 0) & (codes < len(table))
+    out = np.full(len(codes), default, dtype=float)
+    out[known] = table[codes[known]]
+    return np.where(np.isnan(out), default, out)
+
+def _rows_by_team(codes):
+    """{identifiant: indices des lignes} pour un tableau d'identifiants"""
+    return pd.Series(codes).groupby(codes, sort=False).indices
+
+class FeatureStore:
+    """État par équipe (forme, Elo, face-à-face, classement FIFA, stats CAN) interrogeable
+    à n'importe quelle date en O(log n). Sert à la fois à construire le jeu
+    d'entraînement et à calculer les fonctionnalités en direct.
+    Les tables par équipe sont indexées par l'identifiant entier du registre des équipes."""
+
+    def __init__(self, window=FORM_WINDOW, fifa_point_in_time=False):
+        self.window = window
+        self.fifa_point_in_time = fifa_point_in_time
+        self.registry = TeamRegistry()
+        # identifiant -> dates triées, sommes cumulées (points, diff. de buts) avec un 0 initial
+        # et Elo après chaque match précédé du classement initial
+        self.teams = {}
+        # Elo et face-à-face indexés par identifiant (le registre est partagé avec l'Elo)
+        self.elo = EloRatings(self.registry)
+        self.h2h = H2HIndex()
+        # Tables statiques indexées par identifiant (NaN: pas de valeur pour l'équipe)
+        self.fifa_latest = np.array([])
+        self.fifa_history = {}
+        self.can_win_rate = np.array([])
+        self.can_titles = np.array([])
+        # Noms des tables auxiliaires sans équipe correspondante dans l'historique des matchs
+        self.unmatched = {}
+        self.last_match_date = None
+
+    @classmethod
+    def from_tables(cls, matches, df_fifa, df_team_stats, df_champions, df_fifa_history=None,
+                    window=FORM_WINDOW, fifa_point_in_time=False):
+        """Construit le store à partir de l'historique des matchs (team1, team2, date, scores,
+        result) trié par date et des tables nettoyées"""
+        store = cls(window, fifa_point_in_time)
+        # Identifiants stables: équipes de l'historique par ordre alphabétique
+        store.registry = TeamRegistry(sorted(set(matches['team1'].astype(str)) | set(matches['team2'].astype(str))))
+        store.elo = EloRatings(store.registry)
+        # Elo: une passe chronologique, l'état final reste dans store.elo pour le direct
+        elo = store.elo.process(matches)
+        long = to_long_format(matches)
+        long['team'] = store.registry.encode(long['team'].astype(str))
+        long['elo'] = np.where(long['side'] == 'team1',
+                               elo['team1_elo_after'].reindex(long['match_idx']).to_numpy(),
+                               elo['team2_elo_after'].reindex(long['match_idx']).to_numpy())
+        for team, group in long.groupby('team', sort=False):
+            store.teams[int(team)] = {
+                'dates': group['date'].to_numpy().astype('datetime64[ns]'),
+                'cum_points': np.concatenate([[0.0], group['points'].cumsum().to_numpy(dtype=float)]),
+                'cum_goal_diff': np.concatenate([[0.0], group['goal_diff'].cumsum().to_numpy(dtype=float)]),
+                'elo': np.concatenate([[INITIAL_RATING], group['elo'].to_numpy(dtype=float)]),
+            }
+        store.h2h = H2HIndex.from_matches(store.coded(matches))
+        store.last_match_date = pd.Timestamp(matches['date'].max()) if len(matches) else None
+
+        registry = store.registry
+        store.fifa_latest, store.unmatched['fifa_ranking'] = registry.values(df_fifa['country_full'].astype(str), df_fifa['rank'])
+        if df_fifa_history is not None:
+            history = df_fifa_history.sort_values('rank_date', kind='stable')
+            codes = registry.encode(history['country_full'].astype(str))
+            for team, rows in _rows_by_team(codes).items():
+                if team < 0: continue
+                group = history.iloc[rows]
+                store.fifa_history[int(team)] = (group['rank_date'].to_numpy().astype('datetime64[ns]'), group['rank'].to_numpy())
+            store.unmatched['fifa_ranking_history'] = sorted(set(history['country_full'].astype(str)[codes < 0]))
+        store.can_win_rate, store.unmatched['team_statistics'] = registry.values(df_team_stats['team'].astype(str), df_team_stats['win_rate'])
+        store.can_titles, store.unmatched['champions'] = registry.values(df_champions['team'].astype(str), df_champions['can_titles'])
+        return store
+
+    def unmatched_report(self):
+        """Lignes de rapport des noms non rapprochés (tables auxiliaires et requêtes en direct)"""
+        lines = [f"{table}: {', '.join(names)}" for table, names in self.unmatched.items() if names]
+        if self.registry.unmatched:
+            lines.append(f"live requests: {', '.join(sorted(self.registry.unmatched))}")
+        return lines
+
+    def add_match(self, team1, team2, date, home_score, away_score, tournament=None):
+        """Ajoute un match joué (ordre chronologique) à l'état des deux équipes.
+        ValueError si le match précède le dernier match connu: les index de dates resteraient
+        triés à tort et les requêtes à date (recherche binaire) seraient fausses."""
+        if self.last_match_date is not None and pd.Timestamp(date) < self.last_match_date:
+            raise ValueError(f"Match date {pd.Timestamp(date).date()} is before the last recorded match "
+                             f"({self.last_match_date.date()})")
+        date = _as_datetime64(date)
+        result = 'W' if home_score > away_score else ('L' if home_score < away_score else 'D')
+        id1, id2 = self.registry.add(team1), self.registry.add(team2)
+        _, (elo1, elo2) = self.elo.update(id1, id2, home_score, away_score, tournament, date)
+        for team, points, goal_diff, elo in [
+            (id1, POINTS_FOR[result], home_score - away_score, elo1),
+            (id2, POINTS_AGAINST[result], away_score - home_score, elo2),
+        ]:
+            state = self.teams.get(team) or {
+                'dates': np.array([], dtype='datetime64[ns]'), 'cum_points': np.zeros(1), 'cum_goal_diff': np.zeros(1),
+                'elo': np.array([INITIAL_RATING])
+            }
+            # Nouvel état remplacé d'un bloc: une lecture concurrente voit l'ancien ou le nouveau, jamais un mélange
+            self.teams[team] = {
+                'dates': np.append(state['dates'], date),
+                'cum_points': np.append(state['cum_points'], state['cum_points'][-1] + points),
+                'cum_goal_diff': np.append(state['cum_goal_diff'], state['cum_goal_diff'][-1] + goal_diff),
+                'elo': np.append(state['elo'], elo),
+            }
+        self.h2h.update(id1, id2, date, result)
+        if self.last_match_date is None or pd.Timestamp(date) > self.last_match_date:
+            self.last_match_date = pd.Timestamp(date)
+
+    # --- Requêtes à une date (O(log n)) ---
+
+    def _position(self, dates, as_of):
+        """Nombre d'entrées strictement antérieures à `as_of` (toutes si None)"""
+        if as_of is None:
+            return len(dates)
+        return int(np.searchsorted(dates, _as_datetime64(as_of), side='left'))
+
+    def _static(self, table, team, default):
+        """Valeur d'une table statique pour une équipe (défaut si sans valeur)"""
+        team_id = self.registry.lookup(team)
+        if 0 <= team_id < len(table) and not np.isnan(table[team_id]):
+            return table[team_id]
+        return default
+
+    def form(self, team, as_of=None):
+        """(points, diff. de buts moyenne) sur les `window` derniers matchs avant `as_of`"""
+        state = self.teams.get(self.registry.lookup(team))
+        if state is None:
+            return DEFAULT_FORM_POINTS, 0
+        p = self._position(state['dates'], as_of)
+        n = min(p, self.window)
+        if n == 0:
+            return DEFAULT_FORM_POINTS, 0
+        points = state['cum_points'][p] - state['cum_points'][p - n]
+        goal_diff = (state['cum_goal_diff'][p] - state['cum_goal_diff'][p - n]) / n
+        return points, goal_diff
+
+    def rating(self, team, as_of=None):
+        """Classement Elo avant `as_of` (courant si None, en O(1)); ValueError si l'équipe est inconnue"""
+        if as_of is None:
+            return self.elo.rating(self.registry.get(team))
+        state = self.teams.get(self.registry.lookup(team))
+        if state is None:
+            return INITIAL_RATING
+        return state['elo'][self._position(state['dates'], as_of)]
+
+    def rest(self, team, as_of=None):
+        """(jours depuis le dernier match, matchs joués sur les 30 derniers jours) à la date du match `as_of`.
+        Sans date: aujourd'hui (comme à l'entraînement, la date réelle du match)."""
+        if as_of is None:
+            as_of = pd.Timestamp.today().normalize()
+        state = self.teams.get(self.registry.lookup(team))
+        if state is None:
+            return REST_DAYS_CAP, 0
+        as_of = _as_datetime64(as_of)
+        p = int(np.searchsorted(state['dates'], as_of, side='left'))
+        start = int(np.searchsorted(state['dates'], as_of - np.timedelta64(FATIGUE_WINDOW_DAYS, 'D'), side='left'))
+        if p == 0:
+            return REST_DAYS_CAP, 0
+        days = int((as_of - state['dates'][p - 1]) // np.timedelta64(1, 'D'))
+        return min(days, REST_DAYS_CAP), p - start
+
+    def fifa_rank(self, team, as_of=None):
+        """Classement FIFA: dernier connu, ou publié avant `as_of` en mode point-in-time"""
+        team_id = self.registry.lookup(team)
+        if self.fifa_point_in_time and as_of is not None and team_id in self.fifa_history:
+            dates, ranks = self.fifa_history[team_id]
+            p = self._position(dates, as_of)
+            return ranks[p - 1] if p > 0 else DEFAULT_FIFA_RANK
+        return self._static(self.fifa_latest, team, DEFAULT_FIFA_RANK)
+
+    @timed('features.live')
+    def live_features(self, team1, team2, as_of=None, host=None, stage_group=1, match_date=None):
+        """Fonctionnalités d'un match à venir entre team1 et team2 (noms ou alias d'équipes connues).
+        `match_date`: date du match pour le repos et la fatigue (défaut: `as_of`, sinon aujourd'hui).
+        Une équipe inconnue lève ValueError au lieu de recevoir les valeurs par défaut."""
+        team1, team2 = self.registry.resolve(team1), self.registry.resolve(team2)
+        match_date = match_date if match_date is not None else as_of
+        p1, gd1 = self.form(team1, as_of)
+        p2, gd2 = self.form(team2, as_of)
+        h2h_total, h2h_rate = self.h2h.win_rate(self.registry.get(team1), self.registry.get(team2), as_of)
+        rest1, recent1 = self.rest(team1, match_date)
+        rest2, recent2 = self.rest(team2, match_date)
+        f = {
+            'team1_fifa_rank': self.fifa_rank(team1, as_of), 'team2_fifa_rank': self.fifa_rank(team2, as_of),
+            'team1_elo': self.rating(team1, as_of), 'team2_elo': self.rating(team2, as_of),
+            'team1_last5_points': p1, 'team2_last5_points': p2,
+            'team1_last5_goal_diff': gd1, 'team2_last5_goal_diff': gd2,
+            'team1_can_win_rate': self._static(self.can_win_rate, team1, DEFAULT_CAN_WIN_RATE),
+            'team2_can_win_rate': self._static(self.can_win_rate, team2, DEFAULT_CAN_WIN_RATE),
+            'h2h_total_matches': h2h_total, 'h2h_team1_win_rate': h2h_rate,
+            'team1_is_host': int(team1 == host), 'team2_is_host': int(team2 == host),
+            'stage_group': stage_group,
+            'days_since_last_match_team1': rest1, 'days_since_last_match_team2': rest2,
+            'team1_matches_last30': recent1, 'team2_matches_last30': recent2,
+            'team1_can_titles': int(self._static(self.can_titles, team1, DEFAULT_CAN_TITLES)),
+            'team2_can_titles': int(self._static(self.can_titles, team2, DEFAULT_CAN_TITLES)),
+        }
+        f.update(composite_features(f))
+        return {col: f[col] for col in FEATURE_COLUMNS}
+
+    # --- Construction vectorisée du jeu d'entraînement ---
+
+    def codes(self, names):
+        """Identifiants des équipes d'une colonne de noms (-1 si inconnue)"""
+        return self.registry.encode(names.astype(str))
+
+    def coded(self, df):
+        """Copie de df avec team1/team2 remplacés par leurs identifiants"""
+        return df.assign(team1=self.codes(df['team1']), team2=self.codes(df['team2']))
+
+    @timed('features.last5_stats')
+    def form_features(self, df):
+        """Forme de team1 et team2 avant chaque match de df (recherche binaire par équipe)"""
+        w = self.window
+        out = pd.DataFrame(index=df.index)
+        for side in ['team1', 'team2']:
+            points = np.full(len(df), DEFAULT_FORM_POINTS)
+            goal_diff = np.zeros(len(df))
+            for team, rows in _rows_by_team(self.codes(df[side])).items():
+                state = self.teams.get(team)
+                if state is None: continue
+                p = np.searchsorted(state['dates'], df['date'].to_numpy()[rows].astype('datetime64[ns]'), side='left')
+                n = np.minimum(p, w)
+                has = n > 0
+                points[rows] = np.where(has, state['cum_points'][p] - state['cum_points'][p - n], DEFAULT_FORM_POINTS)
+                goal_diff[rows] = np.where(has, (state['cum_goal_diff'][p] - state['cum_goal_diff'][p - n]) / np.maximum(n, 1), 0)
+            out[f'{side}_last{w}_points'] = points
+            out[f'{side}_last{w}_goal_diff'] = goal_diff
+        return out
+
+    @timed('features.elo')
+    def elo_features(self, df):
+        """Elo de team1 et team2 avant chaque match de df (matchs du même jour exclus)"""
+        out = pd.DataFrame(index=df.index)
+        dates = df['date'].to_numpy().astype('datetime64[ns]')
+        for side in ['team1', 'team2']:
+            ratings = np.full(len(df), INITIAL_RATING)
+            for team, rows in _rows_by_team(self.codes(df[side])).items():
+                state = self.teams.get(team)
+                if state is None: continue
+                ratings[rows] = state['elo'][np.searchsorted(state['dates'], dates[rows], side='left')]
+            out[f'{side}_elo'] = ratings
+        return out
+
+    @timed('features.rest')
+    def rest_features(self, df):
+        """Repos et fatigue de team1 et team2 avant chaque match de df (index de dates trié par équipe)"""
+        out = pd.DataFrame(index=df.index)
+        dates = df['date'].to_numpy().astype('datetime64[ns]')
+        for side in ['team1', 'team2']:
+            days = np.full(len(df), REST_DAYS_CAP)
+            recent = np.zeros(len(df), dtype=int)
+            for team, rows in _rows_by_team(self.codes(df[side])).items():
+                state = self.teams.get(team)
+                if state is None: continue
+                p = np.searchsorted(state['dates'], dates[rows], side='left')
+                start = np.searchsorted(state['dates'], dates[rows] - np.timedelta64(FATIGUE_WINDOW_DAYS, 'D'), side='left')
+                previous = state['dates'][np.maximum(p - 1, 0)]
+                gap = (dates[rows] - previous) // np.timedelta64(1, 'D')
+                days[rows] = np.where(p > 0, np.minimum(gap, REST_DAYS_CAP), REST_DAYS_CAP)
+                recent[rows] = p - start
+            out[f'days_since_last_match_{side}'] = days
+            out[f'{side}_matches_last30'] = recent
+        return out
+
+    @timed('features.h2h')
+    def h2h_features(self, df):
+        """Face-à-face avant chaque match de df: passe cumulative unique sur df, plus l'historique
+        de l'index antérieur à la première confrontation de chaque paire dans df (une recherche par paire).
+        df contient tous les matchs à partir de sa première date (jeu complet ou matchs ajoutés)."""
+        index = df.index
+        df = self.coded(df.sort_values('date', kind='stable'))
+        pairs = cumulative_h2h(df)
+        by_pair = pairs.groupby(['first', 'second'], sort=False)
+        first_dates = by_pair['date'].first()
+        offsets = np.array([self.h2h.pair_counts(first, second, date) for (first, second), date
+                            in zip(first_dates.index, first_dates.to_numpy().astype('datetime64[ns]').astype(np.int64))],
+                           dtype=float).reshape(-1, 3)
+        group = by_pair.ngroup().to_numpy()
+        team1_is_first = df['team1'].to_numpy() == pairs['first'].to_numpy()
+        total = pairs['total'].to_numpy() + offsets[group, 0]
+        wins = pairs['team1_wins'].to_numpy() + np.where(team1_is_first, offsets[group, 1], offsets[group, 2])
+        rate = np.divide(wins, total, out=np.full(len(df), DEFAULT_H2H_WIN_RATE), where=total > 0)
+        out = pd.DataFrame({'h2h_total_matches': total.astype(int), 'h2h_team1_win_rate': rate}, index=df.index)
+        return out.reindex(index)
+
+    @timed('features.fifa_rank')
+    def fifa_rank_features(self, df):
+        """Classement FIFA de team1 et team2 (dernier connu, ou à la date du match)"""
+        out = pd.DataFrame(index=df.index)
+        for side in ['team1', 'team2']:
+            if self.fifa_point_in_time:
+                out[f'{side}_fifa_rank'] = [self.fifa_rank(t, d) for t, d in zip(df[side], df['date'])]
+            else:
+                out[f'{side}_fifa_rank'] = _take(self.fifa_latest, self.codes(df[side]), DEFAULT_FIFA_RANK)
+        return out
+
+    @timed('features.match_features')
+    def match_features(self, df):
+        """Toutes les fonctionnalités de chaque match de df, calculées à la date du match"""
+        f = self.fifa_rank_features(df)
+        elo = self.elo_features(df)
+        f[elo.columns] = elo
+
+        print("Calculating Last 5 Matches stats...")
+        form = self.form_features(df)
+        f[form.columns] = form
+
+        for side in ['team1', 'team2']:
+            codes = self.codes(df[side])
+            f[f'{side}_can_win_rate'] = _take(self.can_win_rate, codes, DEFAULT_CAN_WIN_RATE)
+            f[f'{side}_can_titles'] = _take(self.can_titles, codes, DEFAULT_CAN_TITLES).astype(int)
+
+        print("Calculating Head-to-Head stats...")
+        f[['h2h_total_matches', 'h2h_team1_win_rate']] = self.h2h_features(df)
+
+        # Hôte & Contexte
+        for side in ['team1', 'team2']:
+            f[f'{side}_is_host'] = [int(team in CAN_HOSTS.get(year, [])) for team, year in zip(df[side], df['year'])]
+
+        # Étape (Groupe vs Éliminatoire / Finales)
+        if 'tournament' in df.columns:
+            is_can = df['tournament'].str.contains('African Cup Of Nations|CAN', case=False, na=False)
+            is_qualif = df['tournament'].str.contains('Qualif', case=False, na=False)
+            f['stage_group'] = np.where(is_can & ~is_qualif, 1, 0)
+        else:
+            f['stage_group'] = 0
+
+        # Jours depuis le dernier match et matchs sur les 30 derniers jours
+        rest = self.rest_features(df)
+        f[rest.columns] = rest
+
+        for col, values in composite_features(f).items():
+            f[col] = values
+        return f[FEATURE_COLUMNS]
+
+    def save(self, path=FEATURE_STORE_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        joblib.dump(self, path)
+
+    @staticmethod
+    def load(path=FEATURE_STORE_PATH):
+        return joblib.load(path)
@@ -0,0 +1,141 @@
+"""Moteur d'inférence de la forêt aplatie (tableaux rf_forest/*.npy exportés par 3_train_model.py).
+
+Tous les arbres sont évalués ensemble pour tout le lot: un pas de descente par niveau,
+sans validation d'entrée ni répartition joblib. La normalisation (StandardScaler) est
+intégrée aux seuils, les fonctionnalités brutes sont donc utilisées directement.
+Les tableaux sont exportés sous leur forme de service et utilisés tels quels (mmap):
+les processus de l'API partagent leurs pages.
+"""
+import glob
+import os
+import numpy as np
+
+FOREST_ARRAYS_PATH = 'models/rf_forest'
+# Tableaux de service: racines, enfants (indices globaux), fonctionnalité et seuil de chaque
+# nœud, feuilles, probabilités par feuille, classes
+FOREST_ARRAY_NAMES = ['roots', 'left', 'right', 'feature', 'threshold', 'is_leaf', 'value', 'classes']
+# Écart maximal toléré avec sklearn (probabilités)
+VERIFY_TOLERANCE = 1e-9
+
+def load_forest_arrays(path=FOREST_ARRAYS_PATH, mmap_mode='r'):
+    """Charge les tableaux de la forêt (mappés en mémoire par défaut)"""
+    return {name: np.load(f'{path}/{name}.npy', mmap_mode=mmap_mode) for name in FOREST_ARRAY_NAMES}
+
+_SIGN = np.int64(-2 ** 63)
+
+def _ordered(x):
+    """float64 -> int64 de même ordre (entiers consécutifs = flottants consécutifs)"""
+    bits = np.asarray(x, dtype=np.float64).view(np.int64)
+    return np.where(bits < 0, _SIGN - bits, bits)
+
+def _from_ordered(o):
+    return np.where(o < 0, _SIGN - o, o).astype(np.int64).view(np.float64)
+
+def _largest_left_value(threshold, mean, scale):
+    """Plus grand x (float64) tel que float32((x - mean) / scale) <= threshold, par nœud.
+    La condition est monotone en x: recherche binaire sur la représentation ordonnée."""
+    def goes_left(x):
+        with np.errstate(over='ignore', invalid='ignore'):
+            return ((x - mean) / scale).astype(np.float32) <= threshold
+    lo = np.full(len(threshold), _ordered(-np.finfo(np.float64).max))
+    hi = np.full(len(threshold), _ordered(np.finfo(np.float64).max))
+    always_left = goes_left(_from_ordered(hi))
+    while True:
+        active = hi > lo + 1
+        if not active.any():
+            break
+        # Milieu sans dépassement d'entier
+        mid = (lo >> 1) + (hi >> 1) + (lo & hi & 1)
+        left = goes_left(_from_ordered(mid))
+        lo = np.where(active & left, mid, lo)
+        hi = np.where(active & ~left, mid, hi)
+    return np.where(always_left, np.inf, _from_ordered(lo))
+
+def forest_arrays(model, scaler=None):
+    """Tableaux de service d'une forêt sklearn: indices de nœuds globaux, feuilles qui pointent
+    sur elles-mêmes (la descente continue sans masque), seuils normalisés intégrés"""
+    trees = [est.tree_ for est in model.estimators_]
+    offsets = np.cumsum([0] + [t.node_count for t in trees])
+    left = np.concatenate([t.children_left for t in trees]).astype(np.int64)
+    right = np.concatenate([t.children_right for t in trees]).astype(np.int64)
+    node_ids = np.arange(len(left))
+    # Indices locaux à chaque arbre -> indices globaux
+    tree_offset = np.repeat(offsets[:-1], np.diff(offsets))
+    is_leaf = left == -1
+    feature = np.where(is_leaf, 0, np.concatenate([t.feature for t in trees])).astype(np.int64)
+    threshold = np.concatenate([t.threshold for t in trees]).astype(np.float64)
+    if scaler is not None:
+        threshold[~is_leaf] = fold_scaler(threshold[~is_leaf], feature[~is_leaf], scaler)
+    value = np.concatenate([t.value[:, 0, :] for t in trees]).astype(np.float64)
+    return {
+        'roots': offsets[:-1].astype(np.int64),
+        'left': np.where(is_leaf, node_ids, left + tree_offset),
+        'right': np.where(is_leaf, node_ids, right + tree_offset),
+        'feature': feature,
+        'threshold': threshold,
+        'is_leaf': is_leaf,
+        # Probabilités par feuille (les valeurs peuvent être des effectifs pondérés)
+        'value': value / np.maximum(value.sum(axis=1, keepdims=True), np.finfo(float).tiny),
+        'classes': np.asarray(model.classes_),
+    }
+
+def fold_scaler(threshold, feature, scaler):
+    """Intègre la normalisation aux seuils: x <= T  <=>  float32((x - mean) / scale) <= t.
+    sklearn compare en float32 la valeur normalisée, d'où un T exact (recherche binaire)
+    plutôt que t * scale + mean qui diffère aux arrondis près."""
+    n = len(threshold)
+    scale = scaler.scale_[feature] if scaler.scale_ is not None else np.ones(n)
+    mean = scaler.mean_[feature] if scaler.mean_ is not None else np.zeros(n)
+    return _largest_left_value(threshold, mean, scale)
+
+class FlatForest:
+    """Forêt aléatoire sous forme de tableaux de nœuds contigus (indices globaux).
+    Les tableaux sont utilisés sans copie: mappés en mémoire quand ils viennent de load()."""
+
+    def __init__(self, arrays):
+        for name in FOREST_ARRAY_NAMES:
+            setattr(self, name, arrays[name])
+        self.classes_ = self.classes
+
+    @classmethod
+    def from_model(cls, model, scaler=None):
+        return cls(forest_arrays(model, scaler))
+
+    @classmethod
+    def load(cls, path=FOREST_ARRAYS_PATH):
+        return cls(load_forest_arrays(path))
+
+    @staticmethod
+    def exists(path=FOREST_ARRAYS_PATH):
+        return all(os.path.exists(f'{path}/{name}.npy') for name in FOREST_ARRAY_NAMES)
+
+    def save(self, path=FOREST_ARRAYS_PATH):
+        """Écrit chaque tableau en .npy non compressé (mappable), anciens fichiers supprimés"""
+        os.makedirs(path, exist_ok=True)
+        for stale in glob.glob(f'{path}/*.npy'):
+            os.remove(stale)
+        for name in FOREST_ARRAY_NAMES:
+            np.save(f'{path}/{name}.npy', np.ascontiguousarray(getattr(self, name)))
+
+    def apply(self, X):
+        """Indice global de la feuille atteinte dans chaque arbre: matrice (n, arbres)"""
+        X = np.asarray(X, dtype=np.float64)
+        rows = np.arange(len(X))[:, None]
+        nodes = np.broadcast_to(self.roots, (len(X), len(self.roots))).copy()
+        while not self.is_leaf[nodes].all():
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+
+    def predict_proba(self, X):
+        """Moyenne des probabilités des feuilles sur tous les arbres (comme sklearn)"""
+        return self.value[self.apply(X)].mean(axis=1)
+
+def verify_against_sklearn(forest, model, scaler, X, tol=VERIFY_TOLERANCE):
+    """Compare les probabilités du moteur (X brut) à sklearn (X normalisé).
+    Retourne l'écart maximal; lève ValueError au-delà de la tolérance."""
+    expected = model.predict_proba(scaler.transform(X) if scaler is not None else X)
+    diff = float(np.abs(forest.predict_proba(X) - expected).max()) if len(X) else 0.0
+    if diff > tol:
+        raise ValueError(f"Flat forest differs from sklearn: max |dp| = {diff:.3g} > {tol:g}")
+    return diff
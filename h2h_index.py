@@ -0,0 +1,115 @@
+import bisect
+import numpy as np
+import pandas as pd
+
+DEFAULT_H2H_WIN_RATE = 0.33
+
+def pair_key(team1, team2):
+    """Clé de paire non ordonnée (équipes triées)"""
+    return (team1, team2) if team1 <= team2 else (team2, team1)
+
+def cumulative_h2h(df):
+    """Passe cumulative unique: pour chaque match, nombre de confrontations antérieures
+    (date strictement inférieure) et victoires de team1 sur cette paire.
+    `df` doit être trié par date; team1/team2 sont des identifiants du registre des équipes."""
+    team1 = df['team1'].to_numpy(dtype=np.int64)
+    team2 = df['team2'].to_numpy(dtype=np.int64)
+    first = np.where(team1 <= team2, team1, team2)
+    second = np.where(team1 <= team2, team2, team1)
+    team1_is_first = team1 == first
+
+    # Vainqueur du point de vue de la paire triée
+    first_won = np.where(team1_is_first, df['result'] == 'W', df['result'] == 'L')
+    second_won = np.where(team1_is_first, df['result'] == 'L', df['result'] == 'W')
+
+    pairs = pd.DataFrame({
+        'first': first, 'second': second, 'date': df['date'].to_numpy(),
+        'first_won': first_won.astype(int), 'second_won': second_won.astype(int)
+    }, index=df.index)
+    by_pair = pairs.groupby(['first', 'second'], sort=False)
+    pairs['total'] = by_pair.cumcount()
+    pairs['first_wins'] = by_pair['first_won'].cumsum() - pairs['first_won']
+    pairs['second_wins'] = by_pair['second_won'].cumsum() - pairs['second_won']
+
+    # Confrontations du même jour exclues: on reprend l'état avant le premier match du jour
+    cols = ['total', 'first_wins', 'second_wins']
+    pairs[cols] = pairs.groupby(['first', 'second', 'date'], sort=False)[cols].transform('first')
+    pairs['team1_wins'] = np.where(team1_is_first, pairs['first_wins'], pairs['second_wins'])
+    return pairs
+
+def _timestamp(date):
+    """Date -> entier en nanosecondes (comparaisons et sérialisation rapides); un entier est déjà converti"""
+    if isinstance(date, (int, np.integer)):
+        return int(date)
+    return pd.Timestamp(date).value
+
+def _timestamps(dates):
+    return pd.to_datetime(pd.Series(dates)).to_numpy().astype('datetime64[ns]').astype(np.int64)
+
+class H2HIndex:
+    """Index face-à-face par paire non ordonnée d'identifiants d'équipes: dates des confrontations
+    (en ns) et victoires cumulées de chaque équipe après chaque date"""
+
+    def __init__(self):
+        self.pairs = {}
+
+    @classmethod
+    def from_matches(cls, df):
+        """Construit l'index à partir d'un historique (team1, team2, date, result), équipes en identifiants"""
+        index = cls()
+        df = df.sort_values('date', kind='stable')
+        pairs = cumulative_h2h(df)
+        by_pair = pairs.groupby(['first', 'second'], sort=False)
+        first_wins = by_pair['first_won'].cumsum().to_numpy()
+        second_wins = by_pair['second_won'].cumsum().to_numpy()
+        dates = _timestamps(pairs['date'])
+        for key, rows in by_pair.indices.items():
+            index.pairs[int(key[0]), int(key[1])] = {
+                'dates': dates[rows].tolist(),
+                'first_wins': first_wins[rows].tolist(),
+                'second_wins': second_wins[rows].tolist(),
+            }
+        return index
+
+    def update(self, team1, team2, date, result):
+        """Ajoute un match (result du point de vue de team1: W/D/L)"""
+        first, second = pair_key(team1, team2)
+        entry = self.pairs.setdefault((first, second), {'dates': [], 'first_wins': [], 'second_wins': []})
+        date = _timestamp(date)
+        team1_won, team2_won = int(result == 'W'), int(result == 'L')
+        first_won, second_won = (team1_won, team2_won) if team1 == first else (team2_won, team1_won)
+
+        pos = bisect.bisect_right(entry['dates'], date)
+        prev_first = entry['first_wins'][pos - 1] if pos > 0 else 0
+        prev_second = entry['second_wins'][pos - 1] if pos > 0 else 0
+        entry['dates'].insert(pos, date)
+        entry['first_wins'].insert(pos, prev_first + first_won)
+        entry['second_wins'].insert(pos, prev_second + second_won)
+        # Match inséré dans le passé: décaler les cumuls suivants
+        for i in range(pos + 1, len(entry['dates'])):
+            entry['first_wins'][i] += first_won
+            entry['second_wins'][i] += second_won
+
+    def pair_counts(self, first, second, as_of=None):
+        """(total, victoires de first, victoires de second) d'une paire triée avant `as_of` (exclu).
+        O(1) sans date, O(log n) avec date."""
+        entry = self.pairs.get((first, second))
+        if entry is None:
+            return 0, 0, 0
+        pos = len(entry['dates']) if as_of is None else bisect.bisect_left(entry['dates'], _timestamp(as_of))
+        if pos == 0:
+            return 0, 0, 0
+        return pos, entry['first_wins'][pos - 1], entry['second_wins'][pos - 1]
+
+    def lookup(self, team1, team2, as_of=None):
+        """(total, victoires de team1) avant `as_of` (exclu), ou sur tout l'historique"""
+        first, second = pair_key(team1, team2)
+        total, first_wins, second_wins = self.pair_counts(first, second, as_of)
+        return total, first_wins if team1 == first else second_wins
+
+    def win_rate(self, team1, team2, as_of=None):
+        """(total, taux de victoire de team1) avec la valeur par défaut sans historique"""
+        total, wins = self.lookup(team1, team2, as_of)
+        if total == 0:
+            return 0, DEFAULT_H2H_WIN_RATE
+        return total, wins / total
@@ -0,0 +1,148 @@
+"""Mesure du temps passé dans les fonctions chaudes du pipeline et de l'API.
+
+    with timer('train.search_fit'): ...      # bloc chronométré
+    @timed('cleaning.african_football')      # fonction chronométrée
+    with profiling('2_feature_engineering'): # cProfile si CAN_PROFILE=1
+
+Chaque mesure alimente un histogramme de latence (compteur, somme, seaux cumulés),
+affiché par report() et exposé au format Prometheus par /metrics dans api.py.
+"""
+import bisect
+import cProfile
+import functools
+import io
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+
+# Profilage cProfile opt-in: CAN_PROFILE=1, fichiers .prof et résumé texte dans PROFILE_PATH
+PROFILE = os.environ.get('CAN_PROFILE', '0') == '1'
+PROFILE_PATH = os.environ.get('CAN_PROFILE_PATH', 'profiles')
+PROFILE_TOP = 25
+
+# Bornes supérieures des seaux (secondes), de la microseconde d'une prédiction en cache
+# à la minute d'une recherche d'hyperparamètres
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class Histogram:
+    """Histogramme de latences: compteur, somme, min/max et effectifs par seau"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # dernier seau: +Inf
+        self.count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        """Quantile approché: borne supérieure du seau qui l'atteint"""
+        if self.count == 0:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for bound, n in zip(self.buckets + (self.max,), self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self):
+        return {
+            'count': self.count, 'total_s': self.total,
+            'mean_s': self.total / self.count if self.count else 0.0,
+            'min_s': self.min if self.count else 0.0, 'max_s': self.max,
+            'p50_s': self.quantile(0.5), 'p95_s': self.quantile(0.95), 'p99_s': self.quantile(0.99),
+        }
+
+_histograms = {}
+_lock = threading.Lock()
+
+def observe(name, seconds):
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.observe(seconds)
+
+@contextmanager
+def timer(name):
+    """Chronomètre le bloc et l'enregistre sous `name` (même en cas d'exception)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start)
+
+def timed(name=None):
+    """Décorateur: chronomètre chaque appel de la fonction (nom par défaut: module.fonction)"""
+    def decorator(func):
+        label = name or f'{func.__module__}.{func.__qualname__}'
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(label):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def snapshot():
+    """Copie de toutes les mesures: {nom: statistiques}"""
+    with _lock:
+        return {name: h.snapshot() for name, h in sorted(_histograms.items())}
+
+def reset():
+    with _lock:
+        _histograms.clear()
+
+def report(title="Timings"):
+    """Affiche un tableau des mesures (appels, total, moyenne, max)"""
+    stats = snapshot()
+    if not stats:
+        return
+    print(f"\n⏱️  {title}:")
+    print(f"  {'stage':<40}{'calls':>8}{'total (s)':>12}{'mean (ms)':>12}{'max (ms)':>12}")
+    for name, s in stats.items():
+        print(f"  {name:<40}{s['count']:>8}{s['total_s']:>12.3f}{s['mean_s'] * 1000:>12.2f}{s['max_s'] * 1000:>12.2f}")
+
+def prometheus_text(prefix='can_stage_duration_seconds'):
+    """Histogrammes au format d'exposition texte Prometheus"""
+    lines = [f'# HELP {prefix} Time spent in instrumented stages.', f'# TYPE {prefix} histogram']
+    with _lock:
+        for name, h in sorted(_histograms.items()):
+            cumulative = 0
+            for bound, n in zip(h.buckets, h.counts):
+                cumulative += n
+                lines.append(f'{prefix}_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'{prefix}_bucket{{stage="{name}",le="+Inf"}} {h.count}')
+            lines.append(f'{prefix}_sum{{stage="{name}"}} {h.total}')
+            lines.append(f'{prefix}_count{{stage="{name}"}} {h.count}')
+    return '\n'.join(lines) + '\n'
+
+@contextmanager
+def profiling(name, enabled=None):
+    """Profil cProfile du bloc si CAN_PROFILE=1 (ou enabled=True):
+    écrit PROFILE_PATH/<name>.prof (pour snakeviz/pstats) et <name>.txt (fonctions les plus coûteuses)"""
+    if not (PROFILE if enabled is None else enabled):
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        os.makedirs(PROFILE_PATH, exist_ok=True)
+        profiler.dump_stats(f'{PROFILE_PATH}/{name}.prof')
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(PROFILE_TOP)
+        with open(f'{PROFILE_PATH}/{name}.txt', 'w') as f:
+            f.write(out.getvalue())
+        print(f"✅ Profile saved to {PROFILE_PATH}/{name}.prof")
@@ -0,0 +1,156 @@
+"""Exécute le pipeline 1 → 2 → 3 de façon incrémentale.
+
+Chaque étape est identifiée par l'empreinte (SHA-256) de ses entrées (fichiers, code, paramètres).
+Une étape dont l'empreinte n'a pas changé et dont les sorties sont intactes est sautée.
+Si seuls des matchs ont été ajoutés à la fin du fichier des matchs africains, l'étape des
+fonctionnalités ne calcule que les nouvelles lignes.
+
+    python run_pipeline.py [--force] [--stages clean features train]
+"""
+import argparse
+import glob
+import hashlib
+import importlib
+import json
+import os
+import time
+import pandas as pd
+import storage
+from forest_engine import FOREST_ARRAYS_PATH, FOREST_ARRAY_NAMES
+
+MANIFEST_PATH = 'processed_data/.pipeline_manifest.json'
+MODELS_PATH = 'models'
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def frame_hash(df):
+    """Empreinte du contenu d'un DataFrame (indépendante du format de stockage)"""
+    values = pd.util.hash_pandas_object(df.astype(str), index=False).to_numpy()
+    return hashlib.sha256(values.tobytes()).hexdigest()
+
+def table_file(name):
+    return storage.table_path(name, storage.DATA_FORMAT)
+
+CLEANED_TABLES = ['cleaned_african_football', 'cleaned_can_matches', 'cleaned_fifa_ranking',
+                  'cleaned_fifa_ranking_history', 'cleaned_team_statistics', 'cleaned_champions']
+
+def stages():
+    """Définition des étapes: entrées, paramètres et sorties"""
+    return {
+        'clean': {
+            'inputs': sorted(glob.glob('raw_data/*.csv')) + ['1_data_cleaning.py', 'team_registry.py', 'instrumentation.py', 'storage.py'],
+            'params': {'format': storage.DATA_FORMAT},
+            'outputs': [table_file(name) for name in CLEANED_TABLES],
+        },
+        'features': {
+            'inputs': [table_file(name) for name in CLEANED_TABLES if name != 'cleaned_can_matches'] +
+                      ['2_feature_engineering.py', 'feature_store.py', 'h2h_index.py', 'elo.py',
+                       'team_registry.py', 'instrumentation.py', 'storage.py'],
+            'params': {'format': storage.DATA_FORMAT},
+            'outputs': [table_file('final_dataset_for_modeling'), f'{MODELS_PATH}/feature_store.joblib'],
+        },
+        'train': {
+            'inputs': [table_file('final_dataset_for_modeling'), '3_train_model.py', 'forest_engine.py', 'storage.py'],
+            'params': {'format': storage.DATA_FORMAT},
+            'outputs': [f'{MODELS_PATH}/{name}' for name in
+                        ['rf_model.joblib', 'scaler.joblib', 'label_encoder.joblib', 'feature_names.joblib']] +
+                       [f'{FOREST_ARRAYS_PATH}/{name}.npy' for name in FOREST_ARRAY_NAMES],
+        },
+    }
+
+def load_manifest():
+    if os.path.exists(MANIFEST_PATH):
+        with open(MANIFEST_PATH) as f:
+            return json.load(f)
+    return {}
+
+def save_manifest(manifest):
+    os.makedirs(os.path.dirname(MANIFEST_PATH), exist_ok=True)
+    with open(MANIFEST_PATH, 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+def input_hashes(stage):
+    return {path: file_hash(path) for path in stage['inputs'] if os.path.exists(path)}
+
+def stage_key(hashes, params):
+    payload = json.dumps({'inputs': hashes, 'params': params}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def outputs_intact(stage, record):
+    """Toutes les sorties existent et n'ont pas été modifiées depuis la dernière exécution"""
+    recorded = record.get('outputs', {})
+    return all(os.path.exists(p) and recorded.get(p) == file_hash(p) for p in stage['outputs'])
+
+def appended_matches(record, hashes):
+    """Nombre de matchs déjà traités si seuls des matchs ont été ajoutés (en fin de fichier,
+    postérieurs aux anciens) à cleaned_african_football, sinon None"""
+    african = table_file('cleaned_african_football')
+    previous = record.get('inputs', {})
+    changed = [p for p in set(previous) | set(hashes) if previous.get(p) != hashes.get(p)]
+    if changed != [african] or 'n_matches' not in record:
+        return None
+    df = storage.read_table('cleaned_african_football')
+    n = record['n_matches']
+    if len(df) <= n or frame_hash(df.iloc[:n]) != record.get('prefix_hash'):
+        return None
+    if df['date'].iloc[n:].min() < df['date'].iloc[:n].max():
+        return None
+    return n
+
+def run_stage(name, incremental_from=None):
+    if name == 'clean':
+        importlib.import_module('1_data_cleaning').main()
+    elif name == 'features':
+        features = importlib.import_module('2_feature_engineering')
+        if incremental_from is None:
+            features.main()
+        else:
+            features.update(incremental_from)
+    elif name == 'train':
+        importlib.import_module('3_train_model').train()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--force', action='store_true', help="ignore the cache and rerun every stage")
+    parser.add_argument('--stages', nargs='+', default=['clean', 'features', 'train'], choices=['clean', 'features', 'train'])
+    args = parser.parse_args()
+
+    manifest = load_manifest()
+    report = []
+    for name in args.stages:
+        stage = stages()[name]
+        record = manifest.get(name, {})
+        hashes = input_hashes(stage)
+        key = stage_key(hashes, stage['params'])
+
+        start = time.perf_counter()
+        if not args.force and record.get('key') == key and outputs_intact(stage, record):
+            status = 'hit'
+        else:
+            incremental_from = None
+            if name == 'features' and not args.force and outputs_intact(stage, record):
+                incremental_from = appended_matches(record, hashes)
+            run_stage(name, incremental_from)
+            status = 'miss' if incremental_from is None else f'incremental (+{len(storage.read_table("cleaned_african_football")) - incremental_from} matches)'
+            record = {'key': key, 'inputs': hashes,
+                      'outputs': {p: file_hash(p) for p in stage['outputs'] if os.path.exists(p)}}
+            if name == 'features':
+                df = storage.read_table('cleaned_african_football')
+                record.update({'n_matches': len(df), 'prefix_hash': frame_hash(df)})
+            manifest[name] = record
+            save_manifest(manifest)
+        report.append((name, status, time.perf_counter() - start))
+
+    print("\nPipeline report:")
+    for name, status, elapsed in report:
+        print(f"  {name:<10} {status:<32} {elapsed:8.2f} s")
+    hits = sum(status == 'hit' for _, status, _ in report)
+    print(f"  cache hits: {hits}, misses: {len(report) - hits}")
+
+if __name__ == "__main__":
+    main()
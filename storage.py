@@ -0,0 +1,125 @@
+import os
+import sys
+import pandas as pd
+
+PROCESSED_PATH = 'processed_data'
+
+# Format des fichiers intermédiaires: csv (défaut), parquet ou feather
+DATA_FORMAT = os.environ.get('CAN_DATA_FORMAT', 'csv')
+# Exporter aussi une copie CSV (lisible) quand le format est colonnaire
+EXPORT_CSV = os.environ.get('CAN_EXPORT_CSV', '0') == '1'
+
+FORMATS = {'csv': '.csv', 'parquet': '.parquet', 'feather': '.feather'}
+DATE_COLUMNS = ['date', 'Date', 'rank_date']
+CATEGORY_COLUMNS = [
+    'home_team', 'away_team', 'team1', 'team2', 'team', 'country_full',
+    'result', 'tournament', 'stage', 'confederation'
+]
+
+def table_path(name, fmt, path=PROCESSED_PATH):
+    return f'{path}/{name}{FORMATS[fmt]}'
+
+def optimize_dtypes(df):
+    """Types compacts pour le stockage colonnaire: dates, noms d'équipes catégoriels, petits entiers"""
+    df = df.copy()
+    for col in df.columns:
+        if col in DATE_COLUMNS:
+            df[col] = pd.to_datetime(df[col])
+        elif col in CATEGORY_COLUMNS:
+            df[col] = df[col].astype('category')
+        elif pd.api.types.is_integer_dtype(df[col]) and not pd.api.types.is_bool_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], downcast='integer')
+    return df
+
+def write_table(df, name, path=PROCESSED_PATH, fmt=None, export_csv=None):
+    """Écrit une table intermédiaire dans le format configuré"""
+    fmt = fmt or DATA_FORMAT
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown data format '{fmt}', expected one of {list(FORMATS)}")
+    if fmt == 'csv':
+        df.to_csv(table_path(name, 'csv', path), index=False)
+        return
+    df = optimize_dtypes(df).reset_index(drop=True)
+    if fmt == 'parquet':
+        df.to_parquet(table_path(name, fmt, path), index=False)
+    else:
+        df.to_feather(table_path(name, fmt, path))
+    if export_csv if export_csv is not None else EXPORT_CSV:
+        df.to_csv(table_path(name, 'csv', path), index=False)
+
+class TableAppender:
+    """Écrit une table morceau par morceau, sans la garder en mémoire (même format que write_table,
+    copie CSV comprise). Le schéma colonnaire est fixé par le premier morceau; sans aucun morceau,
+    la table est réécrite vide (`columns`) plutôt que de laisser un ancien fichier."""
+
+    def __init__(self, name, path=PROCESSED_PATH, fmt=None, columns=None, export_csv=None):
+        self.fmt = fmt or DATA_FORMAT
+        if self.fmt not in FORMATS:
+            raise ValueError(f"Unknown data format '{self.fmt}', expected one of {list(FORMATS)}")
+        self.name = name
+        self.path = path
+        self.columns = columns
+        self.export_csv = export_csv if export_csv is not None else EXPORT_CSV
+        self.file = table_path(name, self.fmt, path)
+        self.csv_file = table_path(name, 'csv', path) if self.fmt == 'csv' or self.export_csv else None
+        self.schema = None
+        self.writer = None
+        self.rows = 0
+
+    def __enter__(self):
+        return self
+
+    def append(self, df):
+        if self.csv_file is not None:
+            df.to_csv(self.csv_file, index=False, mode='w' if self.rows == 0 else 'a', header=self.rows == 0)
+        if self.fmt != 'csv':
+            import pyarrow as pa
+            # Pas de catégories ni de réduction des entiers: le type ne doit pas dépendre du morceau
+            table = pa.Table.from_pandas(df.reset_index(drop=True), schema=self.schema, preserve_index=False)
+            if self.writer is None:
+                self.schema = table.schema
+                if self.fmt == 'parquet':
+                    import pyarrow.parquet as pq
+                    self.writer = pq.ParquetWriter(self.file, self.schema)
+                else:
+                    self.writer = pa.ipc.new_file(self.file, self.schema)  # feather v2
+            self.writer.write_table(table)
+        self.rows += len(df)
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.writer is not None:
+            self.writer.close()
+        if exc_type is None and self.rows == 0:
+            write_table(pd.DataFrame(columns=self.columns), self.name, self.path, self.fmt, self.export_csv)
+
+def read_table(name, path=PROCESSED_PATH, fmt=None):
+    """Lit une table intermédiaire: format configuré, sinon le premier format disponible.
+    Les colonnes de date sont toujours retournées en datetime."""
+    candidates = [fmt or DATA_FORMAT] + [f for f in FORMATS if f != (fmt or DATA_FORMAT)]
+    for candidate in candidates:
+        file = table_path(name, candidate, path)
+        if not os.path.exists(file):
+            continue
+        if candidate == 'parquet':
+            return pd.read_parquet(file)
+        if candidate == 'feather':
+            return pd.read_feather(file)
+        # round_trip: relecture exacte des flottants écrits par to_csv
+        df = pd.read_csv(file, float_precision='round_trip')
+        for col in DATE_COLUMNS:
+            if col in df.columns:
+                df[col] = pd.to_datetime(df[col])
+        return df
+    raise FileNotFoundError(f"No table '{name}' in {path} (tried {', '.join(candidates)})")
+
+def export_all_csv(path=PROCESSED_PATH):
+    """Exporte en CSV toutes les tables colonnaires de `path`"""
+    for file in sorted(os.listdir(path)):
+        name, ext = os.path.splitext(file)
+        if ext in ('.parquet', '.feather'):
+            read_table(name, path, fmt=ext[1:]).to_csv(table_path(name, 'csv', path), index=False)
+            print(f"Exported {name}.csv")
+
+if __name__ == "__main__":
+    # python storage.py [dossier]: copie CSV lisible des tables colonnaires
+    export_all_csv(sys.argv[1] if len(sys.argv) > 1 else PROCESSED_PATH)
@@ -0,0 +1,125 @@
+"""Registre canonique des équipes: un identifiant entier par équipe et ses alias
+(noms français, variantes anglaises, noms historiques).
+
+Les noms canoniques suivent la convention du nettoyage (anglais, title case). Toutes les
+sources (matchs, classement FIFA, statistiques, palmarès, API) passent par `canonical_name`;
+le feature store indexe ses tables par identifiant.
+"""
+import re
+import unicodedata
+from collections import Counter
+import numpy as np
+import pandas as pd
+
+# Nom canonique -> alias connus (la casse, les accents et la ponctuation sont ignorés)
+TEAM_ALIASES = {
+    'Algeria': ['Algérie'],
+    'Benin': ['Bénin', 'Dahomey'],
+    'Burkina Faso': ['Upper Volta', 'Haute-Volta'],
+    'Cameroon': ['Cameroun'],
+    'Cape Verde': ['Cabo Verde', 'Cap-Vert'],
+    'Central African Republic': ['Centrafrique', 'République centrafricaine'],
+    'Chad': ['Tchad'],
+    'Comoros': ['Comores'],
+    'Congo': ['Congo-Brazzaville', 'PR Congo', 'Republic of the Congo'],
+    'Dr Congo': ['RD Congo', 'Congo DR', 'Congo-Kinshasa', 'Congo-Léopoldville', 'Zaire',
+                 'Democratic Republic of the Congo'],
+    'Egypt': ['Égypte', 'United Arab Rep.', 'United Arab Republic'],
+    'Equatorial Guinea': ['Guinée équatoriale'],
+    'Eswatini': ['Swaziland'],
+    'Ethiopia': ['Éthiopie'],
+    'Gambia': ['The Gambia', 'Gambie'],
+    'Guinea': ['Guinée'],
+    'Guinea-Bissau': ['Guinée-Bissau'],
+    'Ivory Coast': ["Côte d'Ivoire"],
+    'Libya': ['Libye'],
+    'Mauritania': ['Mauritanie'],
+    'Mauritius': ['Maurice'],
+    'Morocco': ['Maroc'],
+    'Namibia': ['Namibie'],
+    'Senegal': ['Sénégal'],
+    'South Africa': ['Afrique du Sud'],
+    'Sudan': ['Soudan'],
+    'São Tomé And Príncipe': ['Sao Tome And Principe'],
+    'Tanzania': ['Tanzanie'],
+    'Tunisia': ['Tunisie'],
+    'Uganda': ['Ouganda'],
+    'Zambia': ['Zambie'],
+}
+
+def alias_key(name):
+    """Clé de comparaison: sans accents, casse, ponctuation ni espaces multiples"""
+    text = unicodedata.normalize('NFKD', str(name))
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(re.sub(r'[^0-9a-z]+', ' ', text.casefold()).split())
+
+_ALIAS_TABLE = {
+    alias_key(alias): canonical
+    for canonical, aliases in TEAM_ALIASES.items() for alias in [canonical, *aliases]
+}
+
+def canonical_name(name):
+    """Nom canonique: alias connu, sinon convention du nettoyage (strip, title case)"""
+    if pd.isna(name):
+        return name
+    return _ALIAS_TABLE.get(alias_key(name), str(name).strip().title())
+
+class TeamRegistry:
+    """Équipes connues: identifiant entier <-> nom canonique, résolution des alias en O(1).
+    Les noms inconnus sont comptés dans `unmatched` au lieu d'être remplacés par un défaut."""
+
+    def __init__(self, names=()):
+        self.names = []
+        self.ids = {}
+        self.unmatched = Counter()
+        for name in names:
+            self.add(name)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return self.lookup(name) >= 0
+
+    def add(self, name):
+        """Identifiant de l'équipe (créée si nouvelle)"""
+        canonical = canonical_name(name)
+        key = alias_key(canonical)
+        if key not in self.ids:
+            self.ids[key] = len(self.names)
+            self.names.append(canonical)
+        return self.ids[key]
+
+    def lookup(self, name):
+        """Identifiant de l'équipe, -1 si inconnue"""
+        if name is None or pd.isna(name):
+            return -1
+        return self.ids.get(alias_key(canonical_name(name)), -1)
+
+    def get(self, name):
+        """Identifiant d'une équipe connue; ValueError (et comptage) sinon"""
+        team_id = self.lookup(name)
+        if team_id < 0:
+            self.unmatched[str(name)] += 1
+            raise ValueError(f"Unknown team: {name!r}")
+        return team_id
+
+    def resolve(self, name):
+        """Nom canonique d'une équipe connue; ValueError sinon"""
+        return self.names[self.get(name)]
+
+    def encode(self, names, add=False):
+        """Identifiants d'une Series de noms (chaque nom distinct résolu une fois).
+        Sans `add`, les noms inconnus valent -1."""
+        names = pd.Series(names).astype(object)
+        table = {name: (self.add(name) if add else self.lookup(name)) for name in names.dropna().unique()}
+        return names.map(table).fillna(-1).to_numpy(dtype=np.int64)
+
+    def values(self, names, values, default=np.nan):
+        """Tableau indexé par identifiant à partir de deux colonnes (nom, valeur).
+        Retourne (tableau, noms sans équipe connue)."""
+        codes = self.encode(names)
+        out = np.full(len(self), default, dtype=float)
+        known = codes >= 0
+        out[codes[known]] = np.asarray(values, dtype=float)[known]
+        return out, sorted(set(pd.Series(names)[~known].astype(str)))
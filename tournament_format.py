@@ -0,0 +1,223 @@
+"""Format complet de la CAN (24 équipes): phase de groupes, meilleurs troisièmes, élimination directe.
+
+La simulation est vectorisée sur les itérations: les scores des 36 matchs de groupe sont tirés
+d'un modèle de Poisson calé sur les probabilités W/D/L du modèle pour chaque paire, les
+classements appliquent les critères de départage de la CAF, et le tableau final réutilise
+les probabilités par paire (nul en élimination directe: tirs au but).
+"""
+import itertools
+import numpy as np
+
+# CAN 2025 (Maroc): groupes du tirage au sort
+CAN_2025_FORMAT = {
+    'groups': {
+        'A': ['Maroc', 'Mali', 'Zambie', 'Comores'],
+        'B': ['Égypte', 'Afrique du Sud', 'Angola', 'Zimbabwe'],
+        'C': ['Nigeria', 'Tunisie', 'Ouganda', 'Tanzanie'],
+        'D': ['Sénégal', 'RD Congo', 'Bénin', 'Botswana'],
+        'E': ['Algérie', 'Burkina Faso', 'Guinée équatoriale', 'Soudan'],
+        'F': ["Côte d'Ivoire", 'Cameroun', 'Gabon', 'Mozambique'],
+    },
+    # Huitièmes dans l'ordre du tableau: '1A' = premier du groupe A, '3BEF' = un meilleur
+    # troisième issu du groupe B, E ou F (attribution par la table des troisièmes)
+    'round_of_16': [
+        ('1D', '3BEF'), ('2A', '2C'), ('1A', '3CDE'), ('2B', '2F'),
+        ('1B', '3ACD'), ('1C', '3ABF'), ('1E', '2D'), ('1F', '2E'),
+    ],
+    'best_thirds': 4,
+    # Table officielle CAF des meilleurs troisièmes (identique à l'Euro 2016): pour chaque
+    # combinaison de groupes qualifiés, groupe du troisième opposé à 1A, 1B, 1C et 1D
+    'third_place_opponents': ['1A', '1B', '1C', '1D'],
+    'third_place_table': {
+        'ABCD': 'CDAB', 'ABCE': 'CABE', 'ABCF': 'CABF', 'ABDE': 'DABE', 'ABDF': 'DABF',
+        'ABEF': 'EABF', 'ACDE': 'CDAE', 'ACDF': 'CDAF', 'ACEF': 'CAFE', 'ADEF': 'DAFE',
+        'BCDE': 'CDBE', 'BCDF': 'CDBF', 'BCEF': 'ECBF', 'BDEF': 'EDBF', 'CDEF': 'CDFE',
+    },
+}
+
+STAGES = ['group_stage', 'group_winner', 'round_of_16', 'quarter_final', 'semi_final', 'final', 'champion']
+
+# Modèle de score: buts par équipe ~ Poisson(λ), plafonnés (bornes des clés de classement)
+MAX_GOALS = 9
+POISSON_TERMS = 16  # termes de la série pour calculer W/D/L d'un couple (λ1, λ2)
+MIN_RATE, MAX_RATE = 0.02, 6.0
+
+# --- Définition du format ---
+
+def group_fixtures(n_teams=4):
+    """Les 6 confrontations d'un groupe (indices locaux)"""
+    return list(itertools.combinations(range(n_teams), 2))
+
+def third_place_table(fmt):
+    """Attribution des meilleurs troisièmes: pour chaque ensemble de groupes qualifiés
+    (masque de bits), le groupe qui occupe chaque place '3...' du tableau (ordre du tableau).
+    Lue dans la table officielle du format, vérifiée contre les places autorisées."""
+    groups = list(fmt['groups'])
+    pairs = [pair for pair in fmt['round_of_16'] if any(code[0] == '3' for code in pair)]
+    # Place de troisième -> (vainqueur de groupe adverse, groupes autorisés)
+    slots = [(next(c for c in pair if c[0] != '3'), set(next(c for c in pair if c[0] == '3')[1:])) for pair in pairs]
+    opponents = fmt['third_place_opponents']
+    table = {}
+    for qualified, assignment in fmt['third_place_table'].items():
+        by_winner = dict(zip(opponents, assignment))
+        perm = [by_winner[winner] for winner, _ in slots]
+        if sorted(perm) != sorted(qualified) or not all(g in allowed for g, (_, allowed) in zip(perm, slots)):
+            raise ValueError(f"Invalid third-place allocation {qualified} -> {assignment}")
+        table[sum(1 << groups.index(g) for g in qualified)] = [groups.index(g) for g in perm]
+    missing = [''.join(c) for c in itertools.combinations(groups, fmt['best_thirds'])
+               if sum(1 << groups.index(g) for g in c) not in table]
+    if missing:
+        raise ValueError(f"Third-place table has no row for groups {missing}")
+    return table
+
+def compile_format(fmt):
+    """Tableaux d'indices utilisés par la simulation vectorisée"""
+    groups = list(fmt['groups'].values())
+    teams = [t for group in groups for t in group]
+    group_size = len(groups[0])
+    fixtures = [(g * group_size + a, g * group_size + b) for g in range(len(groups)) for a, b in group_fixtures(group_size)]
+    home = np.zeros((len(fixtures), len(teams)))
+    away = np.zeros((len(fixtures), len(teams)))
+    for m, (i, j) in enumerate(fixtures):
+        home[m, i] = away[m, j] = 1
+    table = third_place_table(fmt)
+    lookup = np.full((1 << len(groups), fmt['best_thirds']), -1)
+    for mask, assignment in table.items():
+        lookup[mask] = assignment
+    n_combinations = len(list(itertools.combinations(range(len(groups)), fmt['best_thirds'])))
+    assert len(table) == n_combinations, "third-place table must cover every combination"
+    # Places du tableau: (position, groupe) ou (3, indice de place de troisième)
+    slots, third_slot = [], 0
+    names = list(fmt['groups'])
+    for code in (code for pair in fmt['round_of_16'] for code in pair):
+        if code[0] == '3':
+            slots.append((3, third_slot))
+            third_slot += 1
+        else:
+            slots.append((int(code[0]), names.index(code[1])))
+    return {
+        'teams': teams, 'n_groups': len(groups), 'group_size': group_size,
+        'fixtures': np.array(fixtures), 'home': home, 'away': away,
+        'third_lookup': lookup, 'slots': slots, 'best_thirds': fmt['best_thirds'],
+    }
+
+# --- Modèle de score ---
+
+def _poisson_pmf(rate):
+    """pmf[..., k] = P(X = k) pour k < POISSON_TERMS"""
+    k = np.arange(POISSON_TERMS)
+    pmf = np.empty(rate.shape + (POISSON_TERMS,))
+    pmf[..., 0] = np.exp(-rate)
+    for i in k[1:]:
+        pmf[..., i] = pmf[..., i - 1] * rate / i
+    return pmf
+
+def outcome_probs(rate1, rate2):
+    """(P(victoire 1), P(victoire 2)) pour des buts Poisson indépendants"""
+    p1, p2 = _poisson_pmf(rate1), _poisson_pmf(rate2)
+    joint = p1[..., :, None] * p2[..., None, :]
+    win = np.tril(np.ones((POISSON_TERMS, POISSON_TERMS)), -1)
+    return (joint * win).sum(axis=(-2, -1)), (joint * win.T).sum(axis=(-2, -1))
+
+def fit_goal_rates(p_win, p_loss, iterations=30):
+    """Taux de buts (λ1, λ2) reproduisant P(W) et P(L) de chaque paire (Newton vectorisé en log λ).
+    Les nuls très probables ou très rares sont approchés au mieux dans [MIN_RATE, MAX_RATE]."""
+    target = np.stack([p_win, p_loss], axis=-1)
+    x = np.zeros(target.shape)  # log λ, départ λ = 1
+    eps = 1e-6
+    for _ in range(iterations):
+        rate = np.exp(x)
+        f = np.stack(outcome_probs(rate[..., 0], rate[..., 1]), axis=-1) - target
+        jac = np.empty(target.shape + (2,))
+        for d in range(2):
+            shifted = x.copy()
+            shifted[..., d] += eps
+            r = np.exp(shifted)
+            jac[..., d] = (np.stack(outcome_probs(r[..., 0], r[..., 1]), axis=-1) - target - f) / eps
+        det = jac[..., 0, 0] * jac[..., 1, 1] - jac[..., 0, 1] * jac[..., 1, 0]
+        det = np.where(np.abs(det) < 1e-12, 1e-12, det)
+        step0 = (jac[..., 1, 1] * f[..., 0] - jac[..., 0, 1] * f[..., 1]) / det
+        step1 = (-jac[..., 1, 0] * f[..., 0] + jac[..., 0, 0] * f[..., 1]) / det
+        # Pas amorti pour rester dans la zone de validité
+        x = np.clip(x - np.clip(np.stack([step0, step1], axis=-1), -1, 1), np.log(MIN_RATE), np.log(MAX_RATE))
+    return np.exp(x)
+
+def goal_rates_matrix(probs):
+    """rates[i, j] = (buts attendus de i, buts attendus de j) pour teams[i] contre teams[j].
+    probs[i, j] = (W, D, L) du point de vue de teams[i]."""
+    p = np.nan_to_num(probs, nan=1 / 3)
+    rates = fit_goal_rates(p[..., 0], p[..., 2])
+    n = probs.shape[0]
+    rates[np.arange(n), np.arange(n)] = 1.0
+    return rates
+
+# --- Phase de groupes ---
+
+def rank_key(points, h2h_points, h2h_gd, h2h_gf, gd, gf, lots):
+    """Clé de classement CAF (ordre décroissant): points, puis confrontations directes entre
+    équipes à égalité de points (points, différence, buts marqués), différence générale,
+    buts marqués, tirage au sort. Chaque critère occupe son propre champ de bits."""
+    span = 3 * MAX_GOALS
+    key = points
+    for value, width in [(h2h_points, 4), (h2h_gd + span, 6), (h2h_gf, 5), (gd + span, 6), (gf, 5)]:
+        key = key * (1 << width) + value
+    return key + lots
+
+def play_group_stage(comp, rates, rng, n_iter):
+    """Tire les scores des matchs de groupe et classe chaque groupe.
+    Retourne (classement par groupe: (n_iter, groupes, équipes) d'indices, stats des équipes)."""
+    i, j = comp['fixtures'][:, 0], comp['fixtures'][:, 1]
+    goals1 = np.minimum(rng.poisson(rates[i, j, 0], size=(n_iter, len(i))), MAX_GOALS)
+    goals2 = np.minimum(rng.poisson(rates[i, j, 1], size=(n_iter, len(i))), MAX_GOALS)
+    points1 = 3 * (goals1 > goals2) + (goals1 == goals2)
+    points2 = 3 * (goals2 > goals1) + (goals1 == goals2)
+    home, away = comp['home'], comp['away']
+
+    points = points1 @ home + points2 @ away
+    gf = goals1 @ home + goals2 @ away
+    ga = goals2 @ home + goals1 @ away
+    # Mini-championnat entre équipes à égalité de points
+    tied = points[:, i] == points[:, j]
+    h2h_points = (points1 * tied) @ home + (points2 * tied) @ away
+    h2h_gf = (goals1 * tied) @ home + (goals2 * tied) @ away
+    h2h_ga = (goals2 * tied) @ home + (goals1 * tied) @ away
+
+    key = rank_key(points, h2h_points, h2h_gf - h2h_ga, h2h_gf, gf - ga, gf, rng.random(points.shape))
+    shape = (n_iter, comp['n_groups'], comp['group_size'])
+    order = np.argsort(-key.reshape(shape), axis=2, kind='stable')
+    standings = order + (np.arange(comp['n_groups']) * comp['group_size'])[None, :, None]
+    return standings, {'points': points, 'gd': gf - ga, 'gf': gf}
+
+def best_thirds(comp, standings, stats, rng):
+    """Meilleurs troisièmes (points, différence, buts marqués, tirage au sort) et affectation
+    aux places du tableau. Retourne (n_iter, places de troisième) d'indices d'équipes."""
+    thirds = standings[:, :, 2]
+    pick = lambda values: np.take_along_axis(values, thirds, axis=1)
+    key = rank_key(pick(stats['points']), 0, 0, 0, pick(stats['gd']), pick(stats['gf']), rng.random(thirds.shape))
+    best = np.argsort(-key, axis=1, kind='stable')[:, :comp['best_thirds']]
+    mask = (1 << best).sum(axis=1)
+    groups = comp['third_lookup'][mask]
+    return np.take_along_axis(thirds, groups, axis=1)
+
+def round_of_16_slots(comp, standings, third_teams):
+    """Équipes des huitièmes dans l'ordre du tableau: (n_iter, 16)"""
+    columns = []
+    for position, index in comp['slots']:
+        columns.append(third_teams[:, index] if position == 3 else standings[:, index, position - 1])
+    return np.stack(columns, axis=1)
+
+def simulate_full_counts(comp, probs, rates, n_iter, rng, play_knockout_round):
+    """Une passe vectorisée du tournoi complet: nombre d'itérations où chaque équipe atteint chaque étape.
+    `probs`/`rates` sont indexés comme comp['teams']; `play_knockout_round(probs, team1, team2, rng)`
+    joue un tour à élimination directe (voir 4_simulation_lib)."""
+    n_teams = len(comp['teams'])
+    counts = np.zeros((n_teams, len(STAGES)), dtype=np.int64)
+    counts[:, 0] = n_iter
+    standings, stats = play_group_stage(comp, rates, rng, n_iter)
+    counts[:, 1] = np.bincount(standings[:, :, 0].ravel(), minlength=n_teams)
+    alive = round_of_16_slots(comp, standings, best_thirds(comp, standings, stats, rng))
+    counts[:, 2] = np.bincount(alive.ravel(), minlength=n_teams)
+    for stage in range(3, len(STAGES)):
+        alive = play_knockout_round(probs, alive[:, 0::2], alive[:, 1::2], rng)
+        counts[:, stage] = np.bincount(alive.ravel(), minlength=n_teams)
+    return counts